@@ -0,0 +1,261 @@
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing as mproc
+import random
+import string
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import test_cases
+import testing_suite_gem_finder as testing_suite
+import gem_finder
+
+PI = math.pi
+
+
+class VirtualClockState(testing_suite.State):
+    """State which charges the extraction penalty to a virtual clock instead of sleeping.
+
+    Attributes:
+        virtual_time: accumulated penalty time in seconds.
+        extraction_attempts: number of extract actions executed.
+        steps: number of actions executed.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(VirtualClockState, self).__init__(*args, **kwargs)
+        self.virtual_time = 0.0
+        self.extraction_attempts = 0
+        self.steps = 0
+
+    def update_according_to(self, action: str, noise: bool = testing_suite.NOISE_FLAG):
+        self.steps += 1
+        super(VirtualClockState, self).update_according_to(action, noise=noise)
+
+    def _attempt_extraction(self, gem_type: str, estimate_x: float, estimate_y: float):
+        self.extraction_attempts += 1
+        super(VirtualClockState, self)._attempt_extraction(gem_type, estimate_x, estimate_y)
+
+    def _wait(self, seconds: float):
+        self.virtual_time += seconds
+
+
+def generate_mission(seed: int, rows: int = 6, cols: int = 8, num_gems: int = 10, num_needed: int = 3,
+                     max_distance: float = 2.0, horizon: float = 4.0) -> Dict:
+    """Generate a random Part B mission.
+
+    Args:
+        seed: seed for the map layout.
+        rows: number of map rows.
+        cols: number of map columns.
+        num_gems: number of gems placed on the map.
+        num_needed: number of gem types the robot must extract.
+        max_distance: max distance per move.
+        horizon: distance of max measurement.
+
+    Returns:
+        A mission dictionary in the same format as the Part B test cases.
+    """
+    rng = random.Random(seed)
+    cells = rng.sample(range(rows * cols), min(num_gems + 1, rows * cols))
+    area_map = [['.'] * cols for _ in range(rows)]
+
+    start = cells[0]
+    area_map[start // cols][start % cols] = '@'
+
+    gem_types = []
+    for cell in cells[1:]:
+        gem_type = rng.choice(string.ascii_uppercase)
+        area_map[cell // cols][cell % cols] = gem_type
+        gem_types.append(gem_type)
+
+    unique_types = sorted(set(gem_types))
+    needed_gems = sorted(rng.sample(unique_types, min(num_needed, len(unique_types))))
+
+    return {'test_case': f'seed {seed}',
+            'seed': seed,
+            'area_map': [''.join(row) for row in area_map],
+            'needed_gems': needed_gems,
+            'robot_distance_noise': 0.05,
+            'robot_bearing_noise': 0.02,
+            'max_distance': max_distance,
+            'max_steering': PI / 2. + 0.01,
+            'horizon': horizon}
+
+
+def run_mission(job: Tuple[Dict, Dict, int]) -> Dict:
+    """Run a single Part B mission to completion or until max_steps.
+
+    Args:
+        job: (mission, planner_params, max_steps).  planner_params are set as
+            attributes on the planner after construction.
+
+    Returns:
+        Per-mission statistics.
+    """
+    params, planner_params, max_steps = job
+    random.seed(params.get('seed', params['test_case']))
+
+    state = VirtualClockState(params['area_map'],
+                              params['needed_gems'],
+                              params['max_distance'],
+                              params['max_steering'],
+                              measure_distance_noise=params['robot_distance_noise'],
+                              measure_bearing_noise=params['robot_bearing_noise'],
+                              horizon=params['horizon'])
+    error = ''
+    start_time = time.perf_counter()
+
+    try:
+        planner = gem_finder.GemExtractionPlanner(params['max_distance'], params['max_steering'])
+        for name, value in planner_params.items():
+            setattr(planner, name, value)
+
+        while len(state.collected_gems) < len(params['needed_gems']) and state.steps < max_steps:
+            ret = planner.next_move(list(state.gem_checklist), state.generate_measurements())
+            action = ret if isinstance(ret, str) else ret[0]
+            state.update_according_to(action)
+
+    except Exception as exp:
+        error = repr(exp)
+
+    wall_time = time.perf_counter() - start_time
+    collected = len(set(g['type'] for g in state.collected_gems).intersection(params['needed_gems']))
+
+    return {'test_case': params['test_case'],
+            'planner_params': planner_params,
+            'steps': state.steps,
+            'extraction_attempts': state.extraction_attempts,
+            'collected': collected,
+            'needed': len(params['needed_gems']),
+            'wall_time': wall_time,
+            'virtual_time': state.virtual_time,
+            'timed_out': wall_time + state.virtual_time > testing_suite.TIME_LIMIT,
+            'error': error}
+
+
+def run_batch(missions: List[Dict], planner_grid: List[Dict] = None, max_steps: int = 1000,
+              processes: int = None) -> List[Dict]:
+    """Run every mission against every planner parameter set across a process pool.
+
+    Args:
+        missions: missions to run.
+        planner_grid: planner parameter sets to sweep.  Default: planner defaults only.
+        max_steps: step budget per mission.
+        processes: number of worker processes.  Default: cpu count.
+
+    Returns:
+        Per-mission statistics in job order.
+    """
+    if not planner_grid:
+        planner_grid = [{}]
+
+    jobs = [(mission, planner_params, max_steps) for planner_params in planner_grid for mission in missions]
+
+    if testing_suite.DEBUGGING_SINGLE_PROCESS:
+        return list(map(run_mission, jobs))
+
+    with mproc.Pool(processes) as pool:
+        return pool.map(run_mission, jobs, chunksize=max(1, len(jobs) // (4 * (processes or mproc.cpu_count()))))
+
+
+def summarize(results: List[Dict], stream=sys.stdout):
+    """Write per-case results and a per-parameter-set summary.
+
+    Args:
+        results: output of run_batch.
+        stream: stream to write to.
+    """
+    stream.write(f"{'case':>12} {'params':>24} {'steps':>6} {'extract':>7} {'gems':>6} "
+                 f"{'wall(s)':>8} {'penalty(s)':>10}  error\n")
+    for r in results:
+        stream.write(f"{str(r['test_case']):>12} {str(r['planner_params']):>24} {r['steps']:6d} "
+                     f"{r['extraction_attempts']:7d} {r['collected']:3d}/{r['needed']:<2d} "
+                     f"{r['wall_time']:8.3f} {r['virtual_time']:10.2f}  {r['error']}\n")
+
+    stream.write('\n')
+    for key, group in itertools.groupby(sorted(results, key=lambda r: str(r['planner_params'])),
+                                        key=lambda r: str(r['planner_params'])):
+        group = list(group)
+        success = sum(r['collected'] == r['needed'] and not r['timed_out'] for r in group)
+        stream.write(f"params {key}: success {success}/{len(group)}, "
+                     f"mean steps {sum(r['steps'] for r in group) / len(group):.1f}, "
+                     f"mean wall {sum(r['wall_time'] for r in group) / len(group):.3f}s\n")
+
+
+def write_csv(results: List[Dict], filename: str):
+    """Write results to a csv file.
+
+    Args:
+        results: output of run_batch.
+        filename: csv file to write.
+    """
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def parse_grid(specs: List[str]) -> List[Dict]:
+    """Expand 'name=v1,v2' specs into the cartesian product of planner parameters.
+    """
+    names, values = [], []
+    for spec in specs:
+        name, vals = spec.split('=')
+        names.append(name)
+        values.append([float(v) for v in vals.split(',')])
+
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def main(missions: int, seed: int, rows: int, cols: int, gems: int, needed: int, max_steps: int,
+         processes: int, params: List[str], test_cases_only: bool, output: str):
+    if test_cases_only:
+        mission_list = [dict(case) for case in test_cases.GemFinderPartBTestCases.all_cases]
+    else:
+        mission_list = [generate_mission(seed + i, rows, cols, gems, needed) for i in range(missions)]
+
+    start_time = time.perf_counter()
+    results = run_batch(mission_list, parse_grid(params or []), max_steps, processes)
+    elapsed = time.perf_counter() - start_time
+
+    summarize(results)
+    sys.stdout.write(f'\n{len(results)} missions in {elapsed:.2f}s\n')
+
+    if output:
+        write_csv(results, output)
+
+
+def parser():
+    prsr = argparse.ArgumentParser()
+    prsr.add_argument('--missions', help='number of random missions', type=int, default=100)
+    prsr.add_argument('--seed', help='seed of the first mission', type=int, default=0)
+    prsr.add_argument('--rows', help='map rows', type=int, default=6)
+    prsr.add_argument('--cols', help='map columns', type=int, default=8)
+    prsr.add_argument('--gems', help='gems per map', type=int, default=10)
+    prsr.add_argument('--needed', help='needed gem types per map', type=int, default=3)
+    prsr.add_argument('--max-steps', help='step budget per mission', type=int, default=1000)
+    prsr.add_argument('--processes', help='worker processes', type=int, default=None)
+    prsr.add_argument('--param', help="planner attribute sweep, e.g. d=0.3,0.5", action='append')
+    prsr.add_argument('--test-cases', help='run the Part B test cases instead of random missions',
+                      action='store_true')
+    prsr.add_argument('--output', help='csv file for per-mission results', type=str, default=None)
+    return prsr
+
+
+if __name__ == '__main__':
+    args = parser().parse_args()
+    main(missions=args.missions,
+         seed=args.seed,
+         rows=args.rows,
+         cols=args.cols,
+         gems=args.gems,
+         needed=args.needed,
+         max_steps=args.max_steps,
+         processes=args.processes,
+         params=args.param,
+         test_cases_only=args.test_cases,
+         output=args.output)
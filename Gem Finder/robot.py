@@ -13,6 +13,8 @@ import math
 import random
 from typing import Tuple
 
+import numpy as np
+
 PI = math.pi
 
 
@@ -165,6 +167,40 @@ class Robot:
 
         return distance_to_point, bearing_to_point
 
+    def measure_distances_and_bearings_to(self, xs: np.ndarray, ys: np.ndarray, noise: bool = False,
+                                          rng: np.random.Generator = None):
+        """
+        Measure the distance and bearing to many points at once.
+
+        Args:
+            xs: x coordinates of the points.
+            ys: y coordinates of the points.
+            noise: Measure using set noise values.
+            rng: Random generator used for the noise.  Default: a new unseeded generator.
+
+        Returns:
+            Arrays of the distances and bearings to the points.
+        """
+        dx = xs - self.x
+        dy = ys - self.y
+
+        distances = np.sqrt(dx**2 + dy**2)
+        bearings = np.arctan2(dy, dx) - self.bearing
+
+        if noise:
+            if rng is None:
+                rng = np.random.default_rng()
+
+            noise_rate = np.exp(np.maximum(0.0, distances - 2.0) * self.sensor_decay_rate)
+            draws = rng.standard_normal((2, len(distances)))
+
+            distances = distances + draws[0] * (self.measure_distance_noise * noise_rate)
+            bearings = bearings + draws[1] * (self.measure_bearing_noise * noise_rate)
+
+        bearings = truncate_angle(bearings)
+
+        return distances, bearings
+
     def __repr__(self):
         """
         This allows us to print a robot's position
@@ -22,6 +22,8 @@ import string
 from typing import List, Dict
 import sys
 
+import numpy as np
+
 from test_cases import GemFinderPartATestCases, GemFinderPartBTestCases
 
 try:
@@ -178,6 +180,88 @@ class Submission:
             self.submission_action_plan.put([])
 
 
+class GemTable:
+    """Array-backed table of the gems on the map.
+
+    Gems are bucketed on a square grid so that measurements only need to
+    look at the buckets within range of the robot.
+
+    Args:
+        gems: gem dictionaries with 'id', 'x', 'y' and 'type' keys.
+        bucket_size: side of a grid bucket.  Buckets are not used if infinite.
+
+    Attributes:
+        x: x location column.
+        y: y location column.
+        type: gem type column.
+        id: unique gem id column (md5 ids do not fit an integer dtype).
+        active: False once a gem has been extracted.
+    """
+    MIN_BUCKETED_GEMS = 64
+
+    def __init__(self, gems: List[Dict], bucket_size: float = float('inf')):
+        self._rows = list(gems)
+        self.x = np.array([g['x'] for g in gems], dtype=float)
+        self.y = np.array([g['y'] for g in gems], dtype=float)
+        self.type = np.array([g['type'] for g in gems], dtype='<U1')
+        self.id = np.array([g['id'] for g in gems], dtype=object)
+        self.active = np.ones(len(gems), dtype=bool)
+
+        self.bucket_size = bucket_size
+        self._buckets = None
+
+        if math.isfinite(bucket_size) and bucket_size > 0 and len(gems) > self.MIN_BUCKETED_GEMS:
+            self._buckets = dict()
+            cells = zip(np.floor(self.x / bucket_size).astype(int), np.floor(self.y / bucket_size).astype(int))
+            for i, cell in enumerate(cells):
+                self._buckets.setdefault(cell, []).append(i)
+            self._buckets = {cell: np.array(rows) for cell, rows in self._buckets.items()}
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    def active_rows(self):
+        """Gem dictionaries of the gems still on the map, in map order."""
+        return [self._rows[i] for i in np.flatnonzero(self.active)]
+
+    def candidates(self, x: float, y: float, radius: float):
+        """Indices of the active gems which may lie within radius of (x, y), in map order.
+
+        Args:
+            x: x location of the query.
+            y: y location of the query.
+            radius: search radius.
+        """
+        if self._buckets is None or not math.isfinite(radius):
+            return np.flatnonzero(self.active)
+
+        cx0, cx1 = int(math.floor((x - radius) / self.bucket_size)), int(math.floor((x + radius) / self.bucket_size))
+        cy0, cy1 = int(math.floor((y - radius) / self.bucket_size)), int(math.floor((y + radius) / self.bucket_size))
+
+        found = [self._buckets[(cx, cy)]
+                 for cx in range(cx0, cx1 + 1)
+                 for cy in range(cy0, cy1 + 1)
+                 if (cx, cy) in self._buckets]
+        if not found:
+            return np.empty(0, dtype=int)
+
+        idx = np.sort(np.concatenate(found))
+        return idx[self.active[idx]]
+
+    def of_type(self, gem_type: str):
+        """Indices of the active gems of a type, in map order."""
+        return np.flatnonzero(self.active & (self.type == gem_type))
+
+    def remove(self, i: int):
+        """Mark a gem as extracted.
+
+        Returns:
+            The gem dictionary.
+        """
+        self.active[i] = False
+        return self._rows[i]
+
+
 class State:
     """Current State.
 
@@ -199,6 +283,7 @@ class State:
     """
     EXTRACTION_DISTANCE = 0.15
     WAIT_PENALTY = 0.1  # seconds
+    CULL_SIGMAS = 6.0
 
     def __init__(self, area_map: List[list], gem_checklist: List[str] = None, max_distance: float = 1.0,
                  max_steering: float = PI / 2. + 0.01, measure_distance_noise: float = 0.05,
@@ -211,7 +296,6 @@ class State:
         self.collected_gems = []
         self.max_distance = max_distance
         self.max_steering = max_steering
-        self.gem_locs_on_map = []
         self.orig_gem_checklist = []
         self.horizon = horizon
 
@@ -219,6 +303,7 @@ class State:
         cols = len(area_map[0])
 
         self._start_position = dict()
+        gems = []
 
         # Now process the interior of the provided map
         for i in range(rows):
@@ -234,7 +319,7 @@ class State:
                            'y': y - 0.5,
                            'type': this_square}
 
-                    self.gem_locs_on_map.append(gem)
+                    gems.append(gem)
                     self.orig_gem_checklist.append(gem)
 
                 # Process start
@@ -242,6 +327,12 @@ class State:
                     self._start_position['x'] = x + 0.5
                     self._start_position['y'] = y - 0.5
 
+        self.gems = GemTable(gems, bucket_size=horizon)
+
+        # measurement noise comes from a generator seeded off the random module's state, so seeded runs stay
+        # reproducible without drawing from the random stream
+        self.rng = np.random.default_rng(random.getstate()[1])
+
         # initialize the robot at the start position and at a bearing pointing due east
         self.robot = robot.Robot(x=self._start_position['x'],
                                  y=self._start_position['y'],
@@ -251,6 +342,11 @@ class State:
                                  measure_distance_noise=measure_distance_noise,
                                  measure_bearing_noise=measure_bearing_noise)
 
+    @property
+    def gem_locs_on_map(self):
+        """Gems that have not been extracted yet."""
+        return self.gems.active_rows()
+
     def generate_measurements(self, noise: bool = NOISE_FLAG):
         """Generate measurements of gems on map.
 
@@ -262,17 +358,22 @@ class State:
             Measurements to gems in the format:
                 {'unique gem id':{'distance': 0.0, 'bearing': 0.0, 'type': 'A'}, ...}
         """
-        measurements = dict()
-
-        # process gems
-        for location in self.gem_locs_on_map:
-            distance, bearing = self.robot.measure_distance_and_bearing_to((location['x'], location['y']), noise=noise)
-            if distance < self.horizon:
-                measurements[location['id']] = {'distance': distance,
-                                                'bearing': bearing,
-                                                'type': location['type']}
-
-        return measurements
+        # gems further than CULL_SIGMAS noise deviations beyond the horizon can never be measured
+        radius = self.horizon
+        if noise and radius < float('inf'):
+            noise_rate = math.exp(max(0.0, radius - 2.0) * self.robot.sensor_decay_rate)
+            radius += self.CULL_SIGMAS * self.robot.measure_distance_noise * noise_rate
+
+        idx = self.gems.candidates(self.robot.x, self.robot.y, radius)
+        distances, bearings = self.robot.measure_distances_and_bearings_to(self.gems.x[idx], self.gems.y[idx],
+                                                                           noise=noise, rng=self.rng)
+        in_range = np.flatnonzero(distances < self.horizon)
+
+        return {gem_id: {'distance': distance, 'bearing': bearing, 'type': gem_type}
+                for gem_id, distance, bearing, gem_type in zip(self.gems.id[idx[in_range]].tolist(),
+                                                               distances[in_range].tolist(),
+                                                               bearings[in_range].tolist(),
+                                                               self.gems.type[idx[in_range]].tolist())}
 
     def update_according_to(self, action: str, noise: bool = NOISE_FLAG):
         """Update state according to action.
@@ -344,30 +445,39 @@ class State:
         Otherwise, pause for WAIT_PENALTY
         """
 
-        for gem_location in self.gem_locs_on_map:
-            if gem_location['type'] == gem_type:
-                robot_distance = robot.compute_distance((self.robot.x, self.robot.y),
-                                                        (gem_location['x'], gem_location['y']))
+        idx = self.gems.of_type(gem_type)
+
+        robot_distance = np.sqrt((self.gems.x[idx] - self.robot.x)**2 + (self.gems.y[idx] - self.robot.y)**2)
+
+        translated_x = estimate_x + self._start_position['x']
+        translated_y = estimate_y + self._start_position['y']
 
-                translated_x = estimate_x + self._start_position['x']
-                translated_y = estimate_y + self._start_position['y']
+        estimate_distance = np.sqrt((self.gems.x[idx] - translated_x)**2 + (self.gems.y[idx] - translated_y)**2)
 
-                estimate_distance = robot.compute_distance((translated_x, translated_y),
-                                                           (gem_location['x'], gem_location['y']))
+        hits = np.flatnonzero((robot_distance <= self.EXTRACTION_DISTANCE) &
+                              (estimate_distance <= self.EXTRACTION_DISTANCE))
 
-                if robot_distance <= self.EXTRACTION_DISTANCE and estimate_distance <= self.EXTRACTION_DISTANCE:
-                    self.collected_gems.append(gem_location)
-                    self.gem_locs_on_map.remove(gem_location)
-                    self.gem_checklist.remove(gem_location['type'])
+        if len(hits):
+            gem_location = self.gems.remove(idx[hits[0]])
+            self.collected_gems.append(gem_location)
+            self.gem_checklist.remove(gem_location['type'])
 
-                    return
+            return
 
-        time.sleep(self.WAIT_PENALTY)
+        self._wait(self.WAIT_PENALTY)
 
         if VERBOSE_FLAG:
             print(f"*** Location ({self.robot.x}, {self.robot.y}) does not contain a gem type <{gem_type}> within "
                   f"the extraction distance.")
 
+    def _wait(self, seconds: float):
+        """Pause the mission clock for a penalty.
+
+        Args:
+            seconds: length of the penalty.
+        """
+        time.sleep(seconds)
+
     def __repr__(self):
         """Output state object as string.
         """
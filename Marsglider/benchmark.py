@@ -0,0 +1,295 @@
+"""Benchmark marsglider.py on seeded random scenarios.
+
+Scenarios are drawn like generate_params_marsglider.py draws test cases,
+but from a seed and for every combination of the requested noise levels
+and map frequencies.  Each scenario runs through the GliderSimulator of
+testing_suite_full.py (Part A, Part B or both), and the benchmark records
+the steps taken, whether the glider was found or brought home, the time
+spent per call of estimate_next_pos / next_angle and, with --memory, the
+peak memory the run allocated (as traced by tracemalloc, which includes
+NumPy arrays).  Tracing memory slows the student code down a lot, so the
+call times of a --memory run are not comparable to those of other runs.
+Part A simulates the glider --glide-chunk timesteps at a time, which draws
+the glider's random numbers ahead of any marsglider.py draws itself.
+
+The summary groups the runs by part, noise and frequency.  Save the
+per-run results with --output, and pass that file as --compare to a later
+run to see what a change to the filter bought:
+
+    python benchmark.py --scenarios 10 --output before.csv
+    python benchmark.py --scenarios 10 --compare before.csv
+"""
+
+import argparse
+import csv
+import itertools
+import math
+import multiprocessing as mproc
+import queue
+import random
+import sys
+import time
+import tracemalloc
+
+import testing_suite_full as testing_suite
+
+PI = math.pi
+
+NOISE_LEVELS = ['0:0', '0.5:0.025', '1:0.05']
+MAP_FREQS = [2.0, 4.0, 8.0]
+
+
+def generate_scenario(seed, measurement_noise, turning_noise, map_freq, max_steps=4500):
+    """Draw a random start and map for the given noise and map frequency.
+
+    Args:
+        seed(int): seed for the start position, heading and map seed.
+        measurement_noise(float): radar noise.
+        turning_noise(float): turning noise.
+        map_freq(float): map frequency.
+        max_steps(int): step budget.
+
+    Returns:
+        Test parameters in the format of GLOBAL_PARAMETERS.
+    """
+    rng = random.Random(seed)
+    return {'test_case': seed,
+            'target_x': rng.uniform(-250, 250),
+            'target_y': rng.uniform(-250, 250),
+            'target_heading': rng.gauss(0, PI / 4.0),
+            'map_seed': rng.randint(1, 5000),
+            'map_freq': map_freq,
+            'measurement_noise': measurement_noise,
+            'turning_noise': turning_noise,
+            'max_steps': max_steps}
+
+
+def scenario_grid(scenarios, seed, noise_levels, map_freqs, max_steps=4500):
+    """Generate scenarios for every combination of noise level and map frequency.
+
+    The same seeds are used for every combination, so all combinations fly
+    the same starts.
+
+    Args:
+        scenarios(int): scenarios per combination.
+        seed(int): seed of the first scenario.
+        noise_levels(list): 'measurement:turning' noise specs.
+        map_freqs(list): map frequencies.
+        max_steps(int): step budget per scenario.
+    """
+    grid = []
+    for level, freq in itertools.product(noise_levels, map_freqs):
+        measurement_noise, turning_noise = (float(v) for v in level.split(':'))
+        for i in range(scenarios):
+            grid.append(generate_scenario(seed + i, measurement_noise, turning_noise, freq, max_steps))
+    return grid
+
+
+def run_scenario(job):
+    """Run one scenario for one part and measure the student functions.
+
+    Args:
+        job(tuple): (part, params, trace_memory, glide_chunk).
+
+    Returns:
+        Per-run statistics.
+    """
+    part, params, trace_memory, glide_chunk = job
+    params = dict(params, part=part)
+    call_times = []
+
+    if part == 'A':
+        student_function = testing_suite.marsglider.estimate_next_pos
+    else:
+        student_function = testing_suite.marsglider.next_angle
+
+    def timed(*args):
+        start_time = time.perf_counter()
+        result = student_function(*args)
+        call_times.append(time.perf_counter() - start_time)
+        return result
+
+    #The run happens in this process, so the results go through plain queues
+    #(a multiprocessing queue may not have delivered them when read back).
+    simulator = testing_suite.GliderSimulator(glide_chunk=glide_chunk)
+    simulator.glider_steps = queue.Queue(1)
+    simulator.glider_found = queue.Queue(1)
+    simulator.glider_error = queue.Queue(1)
+    test_method = simulator.simulate_without_steering if part == 'A' else simulator.simulate_with_steering
+
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+    start_time = time.perf_counter()
+    test_method(timed, params)
+    wall_time = time.perf_counter() - start_time
+    if trace_memory:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    error = '' if simulator.glider_error.empty() else simulator.glider_error.get().strip().splitlines()[-1]
+    found = False if simulator.glider_found.empty() else simulator.glider_found.get()
+    steps = None if simulator.glider_steps.empty() else simulator.glider_steps.get()
+    call_times.sort()
+
+    return {'part': part,
+            'seed': params['test_case'],
+            'measurement_noise': params['measurement_noise'],
+            'turning_noise': params['turning_noise'],
+            'map_freq': params['map_freq'],
+            'found': bool(found) and not error,
+            'steps': steps,
+            'mean_call_ms': 1000.0 * sum(call_times) / max(1, len(call_times)),
+            'p95_call_ms': 1000.0 * call_times[int(0.95 * (len(call_times) - 1))] if call_times else 0.0,
+            'wall_time': wall_time,
+            'timed_out': wall_time > testing_suite.TIME_LIMIT,
+            'peak_mb': peak / 2.0 ** 20 if peak is not None else None,
+            'error': error}
+
+
+def run_benchmark(scenarios, parts, processes=None, trace_memory=False, glide_chunk=testing_suite.GLIDE_CHUNK):
+    """Run every scenario for every part across a process pool.
+
+    Runs sharing a CPU slow each other down, so per-call times are only
+    comparable between benchmarks run with the same number of processes.
+
+    Args:
+        scenarios(list): test parameters.
+        parts(list): 'A' and/or 'B'.
+        processes(int): worker processes.  Default: cpu count.
+        trace_memory(bool): measure peak memory with tracemalloc.
+        glide_chunk(int): Part A timesteps to simulate at a time.
+
+    Returns:
+        Per-run statistics in job order.
+    """
+    if testing_suite.marsglider1Exc:
+        raise testing_suite.marsglider1Exc
+
+    jobs = [(part, params, trace_memory, glide_chunk) for part in parts for params in scenarios]
+
+    if testing_suite.DEBUGGING_SINGLE_PROCESS:
+        return list(map(run_scenario, jobs))
+
+    with mproc.Pool(processes) as pool:
+        return pool.map(run_scenario, jobs, chunksize=1)
+
+
+def group_key(r):
+    return (r['part'], float(r['measurement_noise']), float(r['turning_noise']), float(r['map_freq']))
+
+
+def group_stats(results):
+    """Summarize the runs of each part, noise level and map frequency.
+
+    Returns:
+        {group key: stats dict}, with steps averaged over successful runs.
+    """
+    stats = {}
+    for key, group in itertools.groupby(sorted(results, key=group_key), key=group_key):
+        group = list(group)
+        found = [r for r in group if r['found'] in (True, 'True')]
+        stats[key] = {'runs': len(group),
+                      'success': len(found) / len(group),
+                      'steps': sum(int(r['steps']) for r in found) / len(found) if found else float('nan'),
+                      'mean_call_ms': sum(float(r['mean_call_ms']) for r in group) / len(group),
+                      'p95_call_ms': sum(float(r['p95_call_ms']) for r in group) / len(group),
+                      'peak_mb': max(float(r['peak_mb'] or 'nan') for r in group),
+                      'timed_out': sum(r['timed_out'] in (True, 'True') for r in group)}
+    return stats
+
+
+def summarize(results, baseline=None, stream=sys.stdout):
+    """Write a table of the group stats, with the change from a baseline if given.
+
+    Args:
+        results(list): output of run_benchmark.
+        baseline(list): earlier results, as read back by read_csv.
+        stream: stream to write to.
+    """
+    stats = group_stats(results)
+    base = group_stats(baseline) if baseline else {}
+
+    stream.write(f"{'part':>4} {'m_noise':>7} {'t_noise':>7} {'freq':>5} {'runs':>4} {'success':>7} "
+                 f"{'steps':>7} {'ms/call':>7} {'p95 ms':>7} {'peak MB':>7} {'slow':>4}"
+                 + ('   vs baseline: success, steps, ms/call' if base else '') + '\n')
+    for key, s in stats.items():
+        part, m_noise, t_noise, freq = key
+        stream.write(f"{part:>4} {m_noise:7.3f} {t_noise:7.3f} {freq:5.1f} {s['runs']:4d} {s['success']:7.0%} "
+                     f"{s['steps']:7.1f} {s['mean_call_ms']:7.2f} {s['p95_call_ms']:7.2f} "
+                     f"{s['peak_mb']:7.1f} {s['timed_out']:4d}")
+        if key in base:
+            b = base[key]
+            stream.write(f"   {s['success'] - b['success']:+6.0%} {s['steps'] - b['steps']:+7.1f} "
+                         f"{s['mean_call_ms'] - b['mean_call_ms']:+7.2f}")
+        stream.write('\n')
+
+    for part in sorted(set(r['part'] for r in results)):
+        part_results = [r for r in results if r['part'] == part]
+        success = sum(r['found'] for r in part_results)
+        stream.write(f"\nPart {part}: success {success}/{len(part_results)}, "
+                     f"mean ms/call {sum(r['mean_call_ms'] for r in part_results) / len(part_results):.2f}, "
+                     f"slower than TIME_LIMIT {sum(r['timed_out'] for r in part_results)}")
+    stream.write('\n')
+
+
+def write_csv(results, filename):
+    """Write results to a csv file."""
+    with open(filename, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0].keys()))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def read_csv(filename):
+    """Read results written by write_csv."""
+    with open(filename, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def main(scenarios, seed, noise_levels, map_freqs, parts, max_steps, processes, trace_memory, glide_chunk,
+         output, compare):
+    scenario_list = scenario_grid(scenarios, seed, noise_levels, map_freqs, max_steps)
+
+    start_time = time.perf_counter()
+    results = run_benchmark(scenario_list, parts, processes, trace_memory, glide_chunk)
+    elapsed = time.perf_counter() - start_time
+
+    summarize(results, read_csv(compare) if compare else None)
+    sys.stdout.write(f'\n{len(results)} runs in {elapsed:.2f}s\n')
+
+    if output:
+        write_csv(results, output)
+
+
+def parser():
+    prsr = argparse.ArgumentParser()
+    prsr.add_argument('--scenarios', help='scenarios per noise level and map frequency', type=int, default=10)
+    prsr.add_argument('--seed', help='seed of the first scenario', type=int, default=0)
+    prsr.add_argument('--noise', help="'measurement:turning' noise level, e.g. 1:0.05 (repeatable)",
+                      action='append')
+    prsr.add_argument('--freq', help='map frequency (repeatable)', type=float, action='append')
+    prsr.add_argument('--part', help='part to run (default: both)', choices=('A', 'B'), action='append')
+    prsr.add_argument('--max-steps', help='step budget per run', type=int, default=4500)
+    prsr.add_argument('--processes', help='worker processes', type=int, default=None)
+    prsr.add_argument('--memory', help='measure peak memory (slows the runs down)', action='store_true')
+    prsr.add_argument('--glide-chunk', help='Part A timesteps to simulate at a time (1: as the grader)',
+                      type=int, default=100)
+    prsr.add_argument('--output', help='csv file for per-run results', type=str, default=None)
+    prsr.add_argument('--compare', help='csv file of an earlier run to compare against', type=str, default=None)
+    return prsr
+
+
+if __name__ == '__main__':
+    args = parser().parse_args()
+    main(scenarios=args.scenarios,
+         seed=args.seed,
+         noise_levels=args.noise or NOISE_LEVELS,
+         map_freqs=args.freq or MAP_FREQS,
+         parts=args.part or ['A', 'B'],
+         max_steps=args.max_steps,
+         processes=args.processes,
+         trace_memory=args.memory,
+         glide_chunk=args.glide_chunk,
+         output=args.output,
+         compare=args.compare)
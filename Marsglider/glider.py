@@ -17,6 +17,11 @@ from past.utils import old_div
 from math import *
 import random
 
+try:
+    from terrain import map_heights
+except ImportError:
+    map_heights = None
+
 
 def angle_trunc(a):
     """Helper function to map all angles onto [-pi, pi]
@@ -80,15 +85,17 @@ class glider(object):
         self.turning_noise = float(new_turn_noise)
         self.altitude_noise = float(new_alt_noise)
 
-    def glide(self, rudder=0.0,  max_turning_angle=pi/8.0):
+    def glide(self, rudder=0.0,  max_turning_angle=pi/8.0, in_place=False):
         """This function optionally turns the robot and then moves it forward.
            Note that the changes are made to a duplicate  glider object that 
            is returned, so the original glider object will not be modified! 
+           With in_place set this glider is moved instead, and returned.
 
         Arguments:
             rudder(float): angle to turn (if provided)
             max_turning_angle(float): max allowed turn.
                 defaults to pi/8.
+            in_place(bool): move this glider rather than a copy.
         """
 
         #Each timestep, we fall 1 unit and trade that for glide_ratio/speed
@@ -109,6 +116,13 @@ class glider(object):
         x = self.x + (self.speed * cos(heading))
         y = self.y + (self.speed * sin(heading))
 
+        if in_place:
+            self.x = x
+            self.y = y
+            self.z = z
+            self.heading = heading
+            return self
+
         ret = glider( x       = x,
                       y       = y,
                       z       = z,
@@ -122,6 +136,57 @@ class glider(object):
 
         return ret
 
+    def glide_many(self, n_steps, rudder=0.0, max_turning_angle=pi/8.0):
+        """Take n_steps timesteps in place with a fixed rudder, sensing before each one.
+
+        Each timestep is the same as calling sense(), get_height() and then
+        glide(rudder, in_place=True), and the random numbers are drawn in that
+        order, so the result is identical to the step by step loop.  The noise
+        is drawn up front and the ground under every position is looked up in
+        one batched map call when the map supports it.
+
+        Arguments:
+            n_steps(int): number of timesteps.
+            rudder(float): angle to turn each timestep.
+            max_turning_angle(float): max allowed turn.
+
+        Returns:
+            (radar, heights, xs, ys, zs, headings) lists.  radar[i] and
+            heights[i] are the readings taken before step i, the others the
+            state after it.
+        """
+        noise = [(random.gauss(0, self.measurement_noise),
+                  random.gauss(0, self.altitude_noise),
+                  random.uniform(-self.turning_noise, self.turning_noise))
+                 for _ in range(n_steps)]
+
+        rudder = min(max_turning_angle, max(-max_turning_angle, rudder))
+        x, y, z, heading = self.x, self.y, self.z, self.heading
+        sense_xs, sense_ys, sense_zs = [], [], []
+        xs, ys, zs, headings = [], [], [], []
+        for _, _, turn in noise:
+            sense_xs.append(x)
+            sense_ys.append(y)
+            sense_zs.append(z)
+            z = z - 1.0
+            heading = angle_trunc(heading + (rudder + turn))
+            x = x + (self.speed * cos(heading))
+            y = y + (self.speed * sin(heading))
+            xs.append(x)
+            ys.append(y)
+            zs.append(z)
+            headings.append(heading)
+        self.x, self.y, self.z, self.heading = x, y, z, heading
+
+        if map_heights is not None:
+            ground = map_heights(self.mapFunc, sense_xs, sense_ys).tolist()
+        else:
+            ground = [self.mapFunc(gx, gy) for gx, gy in zip(sense_xs, sense_ys)]
+
+        radar = [(gz - g) + m for gz, g, (m, _, _) in zip(sense_zs, ground, noise)]
+        heights = [gz + a for gz, (_, a, _) in zip(sense_zs, noise)]
+        return radar, heights, xs, ys, zs, headings
+
     def sense(self):
         """This function represents the glider sensing its hight above ground.
         When measurements are noisy, this will return a value that is close to,
@@ -14,6 +14,18 @@
 from math import *
 from glider import *
 
+import numpy as np
+
+try:
+   from terrain import map_heights
+except ImportError:
+   def map_heights(mapFunc, xs, ys):
+      """Elevations of mapFunc at arrays of points."""
+      batch = getattr(mapFunc, 'batch', None)
+      if batch is not None:
+         return batch(xs, ys)
+      return np.array([mapFunc(x, y) for x, y in zip(xs.tolist(), ys.tolist())])
+
 # If you see different scores locally and on Gradescope this may be an indication
 # that you are uploading a different file than the one you are executing locally.
 # If this local ID doesn't match the ID on Gradescope then you uploaded a different file.
@@ -23,6 +35,129 @@ if OUTPUT_UNIQUE_FILE_ID:
     file_hash = hashlib.md5(pathlib.Path(__file__).read_bytes()).hexdigest()
     print(f'Unique file ID: {file_hash}')
 
+# Particle filter settings.
+NUM_PARTICLES = 20000        # initial (and largest) particle count
+MIN_PARTICLES = 300
+START_RANGE = 250.0          # gliders start within +/- this of (0,0)
+GLIDER_SPEED = 5.0
+PARTICLE_TURN_NOISE = 0.05   # uniform turning noise assumed for particles
+GROUND_SIGMA = 10.0          # std dev of the measured ground elevation
+POSITION_JITTER = 1.0        # std dev added to positions after resampling
+HEADING_JITTER = 0.03        # std dev added to headings after resampling
+PARTICLE_SEED = 0
+# KLD-sampling: enough particles that the KL divergence between the particle
+# histogram and the posterior is below KLD_EPSILON with the probability whose
+# standard normal quantile is KLD_Z.
+KLD_EPSILON = 0.05
+KLD_Z = 2.33
+KLD_BIN_SIZE = 5.0           # histogram bin size in x and y
+KLD_HEADING_BINS = 36
+LOCALIZED_SPREAD = 25.0      # particle spread (m) below which the set may shrink
+LOST_RESIDUAL = 50.0         # RMS ground elevation error (m) of a lost filter
+LOST_STEPS = 3               # steps above LOST_RESIDUAL before re-seeding
+PLOT_POINTS = 200            # particles returned for plotting
+MAX_STEERING = pi / 8.0      # largest rudder angle glider.glide allows
+STEER_LOOKAHEAD = 1          # steps ahead the steering aims from
+
+
+class GliderParticles(object):
+   """Particle filter over glider positions and headings.
+
+   Particles are kept as NumPy arrays (x, y, heading, log weights) and are
+   moved, weighted and resampled all at once.
+   """
+
+   def __init__(self, n=NUM_PARTICLES, seed=PARTICLE_SEED):
+      self.rng = np.random.default_rng(seed)
+      self.residual = 0.0
+      self.lost_steps = 0
+      self.seed_particles(0.0, 0.0, n)
+
+   def seed_particles(self, cx, cy, n=NUM_PARTICLES):
+      """Spread n particles uniformly within START_RANGE of (cx, cy), any heading."""
+      self.x = self.rng.uniform(cx - START_RANGE, cx + START_RANGE, n)
+      self.y = self.rng.uniform(cy - START_RANGE, cy + START_RANGE, n)
+      self.heading = self.rng.uniform(-pi, pi, n)
+      self.log_w = np.zeros(n)
+
+   def __len__(self):
+      return len(self.x)
+
+   def glide(self, rudder=0.0, max_turning_angle=MAX_STEERING,
+             turning_noise=PARTICLE_TURN_NOISE, speed=GLIDER_SPEED):
+      """Move every particle as glider.glide moves one glider."""
+      rudder = min(max_turning_angle, max(-max_turning_angle, rudder))
+      rudder = rudder + self.rng.uniform(-turning_noise, turning_noise, len(self))
+      self.heading = ((self.heading + rudder + pi) % (pi * 2)) - pi
+      self.x += speed * np.cos(self.heading)
+      self.y += speed * np.sin(self.heading)
+
+   def weigh(self, ground, mapFunc, sigma=GROUND_SIGMA):
+      """Weight the particles by how well the map explains the measured ground elevation."""
+      err = map_heights(mapFunc, self.x, self.y) - ground
+      w = self.weights()
+      self.residual = sqrt(np.dot(w, err * err))
+      self.log_w -= 0.5 * (err / sigma) ** 2
+      self.log_w -= self.log_w.max()
+
+   def weights(self):
+      w = np.exp(self.log_w)
+      return w / w.sum()
+
+   def effective_size(self):
+      w = self.weights()
+      return 1.0 / np.sum(w * w)
+
+   def _systematic(self, n):
+      """Indices of n particles drawn by systematic resampling."""
+      positions = (self.rng.random() + np.arange(n)) / n
+      cumulative = np.cumsum(self.weights())
+      cumulative[-1] = 1.0
+      return np.searchsorted(cumulative, positions)
+
+   def kld_size(self):
+      """Number of particles KLD-sampling asks for to represent the current posterior."""
+      idx = self._systematic(len(self))
+      bx = np.floor(self.x[idx] / KLD_BIN_SIZE).astype(np.int64)
+      by = np.floor(self.y[idx] / KLD_BIN_SIZE).astype(np.int64)
+      bh = np.floor((self.heading[idx] + pi) * (KLD_HEADING_BINS / (2 * pi))).astype(np.int64)
+      k = len(np.unique((bx << 40) + (by << 20) + bh))
+      if k < 2:
+         return MIN_PARTICLES
+      a = 2.0 / (9.0 * (k - 1))
+      n = (k - 1) / (2.0 * KLD_EPSILON) * (1.0 - a + sqrt(a) * KLD_Z) ** 3
+      return int(min(NUM_PARTICLES, max(MIN_PARTICLES, ceil(n))))
+
+   def resample(self, n=None):
+      """Systematic resampling to n (default: the current number of) particles."""
+      n = len(self) if n is None else n
+      idx = self._systematic(n)
+      self.x = self.x[idx] + self.rng.normal(0.0, POSITION_JITTER, n)
+      self.y = self.y[idx] + self.rng.normal(0.0, POSITION_JITTER, n)
+      self.heading = self.heading[idx] + self.rng.normal(0.0, HEADING_JITTER, n)
+      self.log_w = np.zeros(n)
+
+   def estimate(self):
+      """Weighted mean position."""
+      w = self.weights()
+      return float(np.dot(w, self.x)), float(np.dot(w, self.y))
+
+   def mean_heading(self):
+      """Weighted circular mean heading."""
+      w = self.weights()
+      return atan2(np.dot(w, np.sin(self.heading)), np.dot(w, np.cos(self.heading)))
+
+   def spread(self):
+      """Weighted standard deviation of the particle positions."""
+      w = self.weights()
+      mx, my = np.dot(w, self.x), np.dot(w, self.y)
+      return sqrt(np.dot(w, (self.x - mx) ** 2 + (self.y - my) ** 2))
+
+   def plot_points(self, k=PLOT_POINTS):
+      idx = self.rng.choice(len(self), size=min(k, len(self)), replace=False)
+      return list(zip(self.x[idx].tolist(), self.y[idx].tolist(), self.heading[idx].tolist()))
+
+
 #This is the function you will have to write for part A. 
 #-The argument 'height' is a floating point number representing 
 # the number of meters your glider is above the average surface based upon 
@@ -49,31 +184,43 @@ if OUTPUT_UNIQUE_FILE_ID:
 # over time.
 #
 
-def estimate_next_pos(height, radar, mapFunc, OTHER=None):
-   """Estimate the next (x,y) position of the glider."""
+def localize(height, radar, mapFunc, particles):
+   """Update the particles with one pair of altimeter and radar readings."""
+
+   #The ground elevation under the glider, as far as the sensors can tell.
+   particles.weigh(height - radar, mapFunc)
 
-   #example of how to find the actual elevation of a point of ground from the map:
-   actualElevation = mapFunc(5,4)
+   #A tight cloud that keeps disagreeing with the radar has locked onto the
+   #wrong place; start over around it with a full particle set.
+   if particles.residual > LOST_RESIDUAL and particles.spread() < LOCALIZED_SPREAD:
+      particles.lost_steps += 1
+   else:
+      particles.lost_steps = 0
+   if particles.lost_steps >= LOST_STEPS:
+      particles.seed_particles(*particles.estimate())
+      particles.lost_steps = 0
 
-   # You must return a tuple of (x,y) estimate, and OTHER (even if it is NONE)
-   # in this order for grading purposes.
-   #
-   xy_estimate = (0,0)  #Sample answer, (X,Y) as a tuple.
+   #Resample to the KLD-sampling particle count when the weights degenerate.
+   #Only shrink the set once the particles have gathered in one place, so
+   #that modes the measurements cannot yet tell apart are not dropped.
+   n = particles.kld_size()
+   if particles.spread() > LOCALIZED_SPREAD:
+      n = max(n, len(particles))
+   if particles.effective_size() < 0.5 * len(particles) or n < 0.5 * len(particles):
+      particles.resample(n)
 
-   #TODO - remove this canned answer which makes this template code
-   #pass one test case once you start to write your solution.... 
-   xy_estimate = (391.4400701739478, 1449.5287170970244) 
 
-   # You may optionally also return a list of (x,y,h) points that you would like
-   # the PLOT_PARTICLES=True visualizer to plot for visualization purposes.
-   # If you include an optional third value, it will be plotted as the heading
-   # of your particle.
+def estimate_next_pos(height, radar, mapFunc, OTHER=None):
+   """Estimate the next (x,y) position of the glider."""
 
-   optionalPointsToPlot = [ (1,1), (2,2), (3,3) ]  #Sample (x,y) to plot 
-   optionalPointsToPlot = [ (1,1,0.5),   (2,2, 1.8), (3,3, 3.2) ] #(x,y,heading)
+   particles = OTHER if OTHER is not None else GliderParticles()
+   localize(height, radar, mapFunc, particles)
 
+   #Estimate where the glider will be after its next step.
+   particles.glide()
+   xy_estimate = particles.estimate()
 
-   return xy_estimate, OTHER, optionalPointsToPlot
+   return xy_estimate, particles, particles.plot_points()
 
 
 # This is the function you will have to write for part B. The goal in part B
@@ -85,16 +232,26 @@ def estimate_next_pos(height, radar, mapFunc, OTHER=None):
 
 def next_angle(height, radar, mapFunc, OTHER=None):
 
-   #How far to turn this timestep, limited to +/-  pi/8, zero means no turn.
+   particles = OTHER if OTHER is not None else GliderParticles()
+   localize(height, radar, mapFunc, particles)
+
+   #Fly straight until localized: turning only blurs the headings further.
+   #Then steer for (0,0) as seen from where the glider will be after
+   #STEER_LOOKAHEAD more steps on its current heading.
    steering_angle = 0.0
+   if particles.spread() < LOCALIZED_SPREAD:
+      x, y = particles.estimate()
+      heading = particles.mean_heading()
+      x += STEER_LOOKAHEAD * GLIDER_SPEED * cos(heading)
+      y += STEER_LOOKAHEAD * GLIDER_SPEED * sin(heading)
+      steering_angle = angle_trunc(atan2(-y, -x) - heading)
+      steering_angle = max(-MAX_STEERING, min(MAX_STEERING, steering_angle))
 
-   # You may optionally also return a list of (x,y)  or (x,y,h) points that 
-   # you would like the PLOT_PARTICLES=True visualizer to plot.
-   #
-   #optionalPointsToPlot = [ (1,1), (20,20), (150,150) ]  # Sample plot points 
-   #return steering_angle, OTHER, optionalPointsToPlot
+   #Move the particles with the same rudder so the next call starts from
+   #where this one left off.
+   particles.glide(steering_angle)
 
-   return steering_angle, OTHER
+   return steering_angle, particles, particles.plot_points()
 
 def who_am_i():
     # Please specify your GT login ID in the whoami variable (ex: jsmith221).
@@ -9,6 +9,8 @@ import sys
 from ctypes import c_long
 from math import floor as _floor
 
+import numpy as np
+
 
 if sys.version_info[0] < 3:
     def floor(num):
@@ -78,6 +80,8 @@ GRADIENTS_4D = (
     -3, -1, -1, -1,     -1, -3, -1, -1,     -1, -1, -3, -1,     -1, -1, -1, -3,
 )
 
+GRADIENTS_2D_ARRAY = np.array(GRADIENTS_2D, dtype=np.int64)
+
 
 def overflow(x):
     # Since normal python ints and longs can be quite humongous we have to use
@@ -112,6 +116,8 @@ class OpenSimplex(object):
             perm_grad_index_3D[i] = int((perm[i] % (old_div(len(GRADIENTS_3D), 3))) * 3)
             source[r] = source[i]
 
+        self._perm_array = np.array(perm, dtype=np.int64)
+
     def _extrapolate2d(self, xsb, ysb, dx, dy):
         perm = self._perm
         index = perm[(perm[xsb & 0xFF] + ysb) & 0xFF] & 0x0E
@@ -243,6 +249,114 @@ class OpenSimplex(object):
 
         return old_div(value, NORM_CONSTANT_2D)
 
+    def _extrapolate2d_array(self, xsb, ysb, dx, dy):
+        perm = self._perm_array
+        index = perm[(perm[xsb & 0xFF] + ysb) & 0xFF] & 0x0E
+
+        return GRADIENTS_2D_ARRAY[index] * dx + GRADIENTS_2D_ARRAY[index + 1] * dy
+
+    def noise2d_array(self, x, y):
+        """
+        Generate 2D OpenSimplex noise for arrays of X,Y coordinates.
+
+        Follows noise2d operation for operation, so every element is
+        bit-identical to the scalar result at the same point.
+        """
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        x, y = np.broadcast_arrays(x, y)
+
+        # Place input coordinates onto grid.
+        stretch_offset = (x + y) * STRETCH_CONSTANT_2D
+        xs = x + stretch_offset
+        ys = y + stretch_offset
+
+        # Floor to get grid coordinates of rhombus (stretched square) super-cell origin.
+        xsb = np.floor(xs)
+        ysb = np.floor(ys)
+
+        # Skew out to get actual coordinates of rhombus origin.
+        squish_offset = (xsb + ysb) * SQUISH_CONSTANT_2D
+        xb = xsb + squish_offset
+        yb = ysb + squish_offset
+
+        # Compute grid coordinates relative to rhombus origin.
+        xins = xs - xsb
+        yins = ys - ysb
+        in_sum = xins + yins
+
+        # Positions relative to origin point.
+        dx0 = x - xb
+        dy0 = y - yb
+
+        xsb = xsb.astype(np.int64)
+        ysb = ysb.astype(np.int64)
+        extrapolate = self._extrapolate2d_array
+
+        # Contribution (1,0)
+        dx1 = dx0 - 1 - SQUISH_CONSTANT_2D
+        dy1 = dy0 - 0 - SQUISH_CONSTANT_2D
+        attn1 = 2 - dx1 * dx1 - dy1 * dy1
+        inside = attn1 > 0
+        attn1 = attn1 * attn1
+        # Starting from 0 turns a -0.0 contribution into 0.0, as in noise2d.
+        value = 0 + np.where(inside, attn1 * attn1 * extrapolate(xsb + 1, ysb + 0, dx1, dy1), 0)
+
+        # Contribution (0,1)
+        dx2 = dx0 - 0 - SQUISH_CONSTANT_2D
+        dy2 = dy0 - 1 - SQUISH_CONSTANT_2D
+        attn2 = 2 - dx2 * dx2 - dy2 * dy2
+        inside = attn2 > 0
+        attn2 = attn2 * attn2
+        value = value + np.where(inside, attn2 * attn2 * extrapolate(xsb + 0, ysb + 1, dx2, dy2), 0)
+
+        # The choices of the scalar version's if/else branches, per point.
+        low = in_sum <= 1
+        zins = np.where(low, 1 - in_sum, 2 - in_sum)
+        near_origin = np.where(low, (zins > xins) | (zins > yins), (zins < xins) | (zins < yins))
+        x_major = xins > yins
+
+        # Extra vertex inside the triangle at (0,0)
+        low_x = near_origin & x_major
+        low_y = near_origin & ~x_major
+        xsv_low = np.where(low_x, xsb + 1, np.where(low_y, xsb - 1, xsb + 1))
+        ysv_low = np.where(low_x, ysb - 1, np.where(low_y, ysb + 1, ysb + 1))
+        dx_low = np.where(low_x, dx0 - 1, np.where(low_y, dx0 + 1, dx0 - 1 - 2 * SQUISH_CONSTANT_2D))
+        dy_low = np.where(low_x, dy0 + 1, np.where(low_y, dy0 - 1, dy0 - 1 - 2 * SQUISH_CONSTANT_2D))
+
+        # Extra vertex inside the triangle at (1,1)
+        xsv_high = np.where(low_x, xsb + 2, np.where(low_y, xsb + 0, xsb))
+        ysv_high = np.where(low_x, ysb + 0, np.where(low_y, ysb + 2, ysb))
+        dx_high = np.where(low_x, dx0 - 2 - 2 * SQUISH_CONSTANT_2D,
+                           np.where(low_y, dx0 + 0 - 2 * SQUISH_CONSTANT_2D, dx0))
+        dy_high = np.where(low_x, dy0 + 0 - 2 * SQUISH_CONSTANT_2D,
+                           np.where(low_y, dy0 - 2 - 2 * SQUISH_CONSTANT_2D, dy0))
+
+        xsv_ext = np.where(low, xsv_low, xsv_high)
+        ysv_ext = np.where(low, ysv_low, ysv_high)
+        dx_ext = np.where(low, dx_low, dx_high)
+        dy_ext = np.where(low, dy_low, dy_high)
+
+        xsb = np.where(low, xsb, xsb + 1)
+        ysb = np.where(low, ysb, ysb + 1)
+        dx0 = np.where(low, dx0, dx0 - 1 - 2 * SQUISH_CONSTANT_2D)
+        dy0 = np.where(low, dy0, dy0 - 1 - 2 * SQUISH_CONSTANT_2D)
+
+        # Contribution (0,0) or (1,1)
+        attn0 = 2 - dx0 * dx0 - dy0 * dy0
+        inside = attn0 > 0
+        attn0 = attn0 * attn0
+        value = value + np.where(inside, attn0 * attn0 * extrapolate(xsb, ysb, dx0, dy0), 0)
+
+        # Extra Vertex
+        attn_ext = 2 - dx_ext * dx_ext - dy_ext * dy_ext
+        inside = attn_ext > 0
+        attn_ext = attn_ext * attn_ext
+        value = value + np.where(inside,
+                                 attn_ext * attn_ext * extrapolate(xsv_ext, ysv_ext, dx_ext, dy_ext), 0)
+
+        return value / NORM_CONSTANT_2D
+
 
     def noise3d(self, x, y, z):
         """
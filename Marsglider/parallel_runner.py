@@ -0,0 +1,215 @@
+"""Run the Mars Glider test cases concurrently.
+
+The Part A and Part B cases of testing_suite_full.py each run in their own
+process, as they do there, but up to --processes of them at once instead of
+one after the other.  Each case is still stopped after TIME_LIMIT seconds
+of wall time from its start, so keep --processes at or below the number of
+CPUs to time the cases as the grader does.
+
+The maps of all cases are built once, before any case starts, as
+terrain.SharedTerrain grids in shared memory.  The case processes read
+elevations from those grids instead of each building two OpenSimplex maps,
+and the elevations are exactly those of getMapFunc.  The grid tiles are
+also saved in terrain.TERRAIN_CACHE_DIR, so later runs load the maps
+instead of building them.
+
+Part A simulates the glider --glide-chunk timesteps at a time (see
+GLIDE_CHUNK in testing_suite_full.py).  That is faster, but the glider's
+random numbers are drawn ahead of any marsglider.py draws itself; use
+--glide-chunk 1 to run the cases exactly as the grader does.
+
+    python parallel_runner.py
+    python parallel_runner.py --part A --case 3 --case 7 --processes 2
+"""
+
+import argparse
+import multiprocessing as mproc
+import sys
+import time
+from multiprocessing.connection import wait
+
+import testing_suite_full as testing_suite
+from terrain import SharedTerrain
+
+
+def case_params(parts, case_ids):
+    """Return the test parameters of the given cases of the given parts.
+
+    Args:
+        parts(list): parts to run, 'A' and/or 'B'.
+        case_ids(list): case numbers to run.
+    """
+    jobs = []
+    for part in parts:
+        for k in case_ids:
+            params = {'part': part}
+            params.update(testing_suite.GLOBAL_PARAMETERS[k])
+            jobs.append(params)
+    return jobs
+
+
+def shared_maps(jobs):
+    """Build one SharedTerrain for every map used by the jobs."""
+    keys = sorted(set((params['map_seed'], params['map_freq']) for params in jobs))
+    return dict((key, SharedTerrain(*key)) for key in keys)
+
+
+def case_methods(simulator, params):
+    """Return the simulator method and student function that run a case."""
+    if params['part'] == 'A':
+        return simulator.simulate_without_steering, testing_suite.marsglider.estimate_next_pos
+    return simulator.simulate_with_steering, testing_suite.marsglider.next_angle
+
+
+def case_result(simulator, params, error_message, wall_time):
+    """Collect the outcome of a finished case from its simulator queues."""
+    glider_found = False
+    steps = None
+
+    if not error_message:
+        if not simulator.glider_error.empty():
+            error_message += simulator.glider_error.get()
+
+        if not simulator.glider_found.empty():
+            glider_found = simulator.glider_found.get()
+
+        if not simulator.glider_steps.empty():
+            steps = simulator.glider_steps.get()
+
+    if not error_message and not glider_found:
+        error_message = testing_suite.NOT_FOUND.format(params['part'], params['test_case'],
+                                                       steps, params['max_steps'])
+
+    return {'part': params['part'],
+            'test_case': params['test_case'],
+            'passed': not error_message,
+            'steps': steps,
+            'wall_time': wall_time,
+            'error': error_message}
+
+
+def run_cases(jobs, maps, processes=None, glide_chunk=testing_suite.GLIDE_CHUNK):
+    """Run the cases, up to processes of them at a time.
+
+    Args:
+        jobs(list): test parameters of the cases.
+        maps(dict): shared map functions, see shared_maps.
+        processes(int): concurrent cases.  Default: cpu count.
+        glide_chunk(int): Part A timesteps to simulate at a time.
+
+    Returns:
+        Per-case results in job order.
+    """
+    if testing_suite.marsglider1Exc:
+        raise testing_suite.marsglider1Exc
+
+    if testing_suite.DEBUGGING_SINGLE_PROCESS:
+        results = []
+        for params in jobs:
+            simulator = testing_suite.GliderSimulator(maps, glide_chunk)
+            test_method, student_method = case_methods(simulator, params)
+            start_time = time.perf_counter()
+            test_method(student_method, params)
+            results.append(case_result(simulator, params, '', time.perf_counter() - start_time))
+        return results
+
+    processes = processes or mproc.cpu_count()
+    results = [None] * len(jobs)
+    pending = list(enumerate(jobs))
+    running = []
+
+    while pending or running:
+        while pending and len(running) < processes:
+            i, params = pending.pop(0)
+            simulator = testing_suite.GliderSimulator(maps, glide_chunk)
+            test_method, student_method = case_methods(simulator, params)
+            process = mproc.Process(target=test_method, args=(student_method, params))
+            process.start()
+            running.append((i, params, simulator, process, time.perf_counter()))
+
+        #Sleep until a case finishes or the oldest one runs out of time.
+        deadline = min(start_time for _, _, _, _, start_time in running) + testing_suite.TIME_LIMIT
+        wait([process.sentinel for _, _, _, process, _ in running],
+             timeout=max(0.0, deadline - time.perf_counter()))
+
+        still_running = []
+        for i, params, simulator, process, start_time in running:
+            wall_time = time.perf_counter() - start_time
+            error_message = ''
+            if process.is_alive():
+                if wall_time < testing_suite.TIME_LIMIT:
+                    still_running.append((i, params, simulator, process, start_time))
+                    continue
+                process.terminate()
+                error_message = ('Test aborted due to CPU timeout. ' +
+                                 'Test was expected to finish in fewer than {} second(s).'.format(
+                                     testing_suite.TIME_LIMIT))
+            process.join()
+            results[i] = case_result(simulator, params, error_message, wall_time)
+        running = still_running
+
+    return results
+
+
+def summarize(results, stream=sys.stdout):
+    """Write failures, per-part successes and the overall score as testing_suite_full does.
+
+    Returns:
+        The overall score.
+    """
+    total_passes = 0
+    for part in sorted(set(r['part'] for r in results)):
+        part_results = [r for r in results if r['part'] == part]
+        stream.write("====================\nTests for Part {}:\n".format(part))
+        for r in part_results:
+            if not r['passed']:
+                stream.write("Test case {}: {}\n".format(r['test_case'], r['error']))
+
+        num_passes = sum(r['passed'] for r in part_results)
+        total_passes += num_passes
+        stream.write("Successes: {}\nFailures: {}\n\n".format(num_passes, len(part_results) - num_passes))
+
+    overall_score = total_passes * testing_suite.CREDIT_PER_PASS
+    if overall_score > 100:
+        stream.write("Score above 100: {}  capped to 101!\n".format(overall_score))
+        overall_score = 101
+    stream.write("====================\nOverall Score: {}\n".format(overall_score))
+    return overall_score
+
+
+def main(parts, case_ids, processes, glide_chunk):
+    jobs = case_params(parts, case_ids)
+
+    start_time = time.perf_counter()
+    maps = shared_maps(jobs)
+    map_time = time.perf_counter() - start_time
+    try:
+        results = run_cases(jobs, maps, processes, glide_chunk)
+    finally:
+        for terrain in maps.values():
+            terrain.close()
+    elapsed = time.perf_counter() - start_time
+
+    summarize(results)
+    sys.stdout.write('{} cases in {:.2f}s ({:.2f}s building {} maps)\n'.format(
+        len(results), elapsed, map_time, len(maps)))
+
+
+def parser():
+    """Parse command-line arguments."""
+    prsr = argparse.ArgumentParser()
+    prsr.add_argument('--part', help='part to run (default: both)', choices=('A', 'B'), action='append')
+    prsr.add_argument('--case', help='case number to run (default: all)', type=int, action='append',
+                      choices=range(1, len(testing_suite.GLOBAL_PARAMETERS)))
+    prsr.add_argument('--processes', help='cases to run at once (default: cpu count)', type=int, default=None)
+    prsr.add_argument('--glide-chunk', help='Part A timesteps to simulate at a time (1: as the grader)',
+                      type=int, default=100)
+    return prsr
+
+
+if __name__ == '__main__':
+    args = parser().parse_args()
+    main(parts=args.part or ['A', 'B'],
+         case_ids=args.case or list(range(1, len(testing_suite.GLOBAL_PARAMETERS))),
+         processes=args.processes,
+         glide_chunk=args.glide_chunk)
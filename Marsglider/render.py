@@ -0,0 +1,187 @@
+"""Headless rendering of Mars Glider runs to PNG frames or a video.
+
+GliderRenderer draws what PLOT_PARTICLES shows with turtle (the terrain,
+(0,0), the glider, the estimate and the student's plot points) into an
+RGB image with NumPy, without opening a window.  The terrain of the window
+is rasterized once, and again only when the glider leaves the window; each
+frame copies it and draws all the points with one indexed assignment per
+color.  Frames are written as PNG files, or piped to ffmpeg as a video when
+ffmpeg is installed.
+"""
+
+import os
+import shutil
+import struct
+import subprocess
+import zlib
+
+import numpy as np
+
+from terrain import map_heights
+
+HEIGHT_MIN = -500.0
+HEIGHT_MAX = 500.0
+
+PNG_COMPRESSION = 1
+VIDEO_FPS = 20
+
+ORIGIN_COLOR = (0, 0, 0)
+POINT_COLOR = (40, 40, 160)
+ESTIMATE_COLOR = (0, 160, 0)
+GLIDER_COLOR = (255, 0, 0)
+
+
+def map_colors(heights, hmin=HEIGHT_MIN, hmax=HEIGHT_MAX):
+    """Return the testing_suite_full.getMapColor colors of an array of elevations as uint8 RGB."""
+    c = np.round((np.clip(heights, hmin, hmax) - hmin) * (127.0 / (hmax - hmin))) + 128
+    rgb = np.empty(np.shape(heights) + (3,), dtype=np.uint8)
+    rgb[..., 0] = 255
+    rgb[..., 1] = 127 + np.round(c * 0.5)
+    rgb[..., 2] = c
+    return rgb
+
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+
+def write_png(filename, rgb, compression=PNG_COMPRESSION):
+    """Write an (height, width, 3) uint8 array as an RGB PNG file."""
+    height, width, _ = rgb.shape
+    raw = np.zeros((height, 1 + 3 * width), dtype=np.uint8)  #filter type 0 for every row
+    raw[:, 1:] = rgb.reshape(height, 3 * width)
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n'
+                + _png_chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+                + _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), compression))
+                + _png_chunk(b'IEND', b''))
+
+
+class PngFrames(object):
+    """Write frames to numbered PNG files in a directory."""
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.count = 0
+
+    def write(self, frame):
+        write_png(os.path.join(self.directory, 'frame_%05d.png' % self.count), frame)
+        self.count += 1
+
+    def close(self):
+        pass
+
+
+class FfmpegVideo(object):
+    """Pipe frames to ffmpeg, which encodes them into a video file."""
+
+    def __init__(self, filename, fps=VIDEO_FPS):
+        self.filename = filename
+        self.fps = fps
+        self.process = None
+
+    def write(self, frame):
+        if self.process is None:
+            height, width, _ = frame.shape
+            self.process = subprocess.Popen(
+                ['ffmpeg', '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgb24',
+                 '-s', '%dx%d' % (width, height), '-r', str(self.fps), '-i', '-',
+                 '-pix_fmt', 'yuv420p', self.filename],
+                stdin=subprocess.PIPE)
+        self.process.stdin.write(frame.tobytes())
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+
+
+def frame_writer(path, video=False):
+    """Return a writer for path: path.mp4 if video is set and ffmpeg is installed, else PNGs in path/."""
+    if video and shutil.which('ffmpeg'):
+        return FfmpegVideo(path + '.mp4')
+    return PngFrames(path)
+
+
+class GliderRenderer(object):
+    """Draw the frames of one glider run offscreen.
+
+    Attributes:
+        x1, y1: lower left corner of the window, in map units.
+        frames: number of frames drawn.
+    """
+
+    def __init__(self, mapFunc, writer, window=400, scale=1.0):
+        """Draw the window -window..window around (0,0) at scale map units per pixel.
+
+        mapFunc only colors the terrain, so a TerrainTileCache is a good
+        choice: its float32 elevations are plenty for a color, and its
+        tiles are kept for the next run.
+        """
+        self.mapFunc = mapFunc
+        self.writer = writer
+        self.size = int(round(2 * window / scale))
+        self.window = window
+        self.scale = scale
+        self.frames = 0
+        self._rasterize(-window, -window)
+
+    def _rasterize(self, x1, y1):
+        """Color the terrain of the window with lower left corner (x1, y1)."""
+        self.x1 = x1
+        self.y1 = y1
+        centers = (np.arange(self.size) + 0.5) * self.scale
+        xs, ys = np.meshgrid(x1 + centers, y1 + 2 * self.window - centers)
+        self.background = map_colors(map_heights(self.mapFunc, xs, ys))
+
+    def _pixels(self, xs, ys):
+        """Return the rows and columns of map points."""
+        cols = np.floor((np.asarray(xs, dtype=float) - self.x1) / self.scale).astype(np.int64)
+        rows = np.floor((self.y1 + 2 * self.window - np.asarray(ys, dtype=float)) / self.scale).astype(np.int64)
+        return rows, cols
+
+    def _dots(self, frame, xs, ys, color, radius):
+        """Draw a (2*radius+1) pixel square at every point."""
+        rows, cols = self._pixels(xs, ys)
+        offsets = np.arange(-radius, radius + 1)
+        rows, cols = np.broadcast_arrays(rows[:, None, None] + offsets[None, :, None],
+                                         cols[:, None, None] + offsets[None, None, :])
+        rows = rows.ravel()
+        cols = cols.ravel()
+        inside = (rows >= 0) & (rows < self.size) & (cols >= 0) & (cols < self.size)
+        frame[rows[inside], cols[inside]] = color
+
+    def draw(self, target, estimate=None, points=None):
+        """Draw and write one frame.
+
+        Args:
+            target(tuple): (x, y) of the glider.
+            estimate(tuple): (x, y) the student estimated, if any.
+            points(list): the student's (x, y) or (x, y, heading) plot points, if any.
+
+        Returns:
+            The frame as an (height, width, 3) uint8 array.
+        """
+        #Follow the glider like the turtle plot does.
+        x, y = target
+        if not (self.x1 <= x < self.x1 + 2 * self.window and self.y1 <= y < self.y1 + 2 * self.window):
+            self._rasterize(x - self.window, y - self.window)
+
+        frame = self.background.copy()
+        span = np.arange(-5, 6)
+        self._dots(frame, np.concatenate([span, 0 * span]), np.concatenate([0 * span, span]),
+                   ORIGIN_COLOR, 0)
+        if points:
+            points = np.asarray([p[:2] for p in points], dtype=float)
+            self._dots(frame, points[:, 0], points[:, 1], POINT_COLOR, 1)
+        if estimate is not None:
+            self._dots(frame, [estimate[0]], [estimate[1]], ESTIMATE_COLOR, 3)
+        self._dots(frame, [x], [y], GLIDER_COLOR, 3)
+
+        self.writer.write(frame)
+        self.frames += 1
+        return frame
+
+    def close(self):
+        self.writer.close()
@@ -0,0 +1,253 @@
+"""Mars terrain elevation maps.
+
+getMapFunc builds the elevation function used by the tester, mapTest.py
+and marsglider.py.  The returned mapFunc(x, y) gives the elevation of one
+point; mapFunc.batch(xs, ys) gives the elevations of arrays of points in a
+single call, bit-identical to calling mapFunc on each point.
+
+mapFunc only depends on the integer parts of x and y, so a map is really an
+integer grid.  TerrainTileCache stores that grid in TILE_SIZE x TILE_SIZE
+float32 tiles, built on first use, kept in memory in an LRU and saved as
+.npy files that later runs memory-map instead of synthesizing noise.
+SharedTerrain keeps the exact elevations around the origin in shared
+memory, so that several processes can use one copy of a map.
+"""
+
+import collections
+import os
+import tempfile
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from opensimplex import OpenSimplex
+
+
+def getMapFunc(Seed, Freq):
+    """Return the elevation function of the map with the given seed and frequency."""
+    #initialize OpenSimplex one time, use it many times.
+    gen = OpenSimplex(Seed)
+
+    def mapFunc(nx, ny):
+        #Force 1 unit resolution by truncating nx,ny to integers.
+        nx = int(nx)
+        ny = int(ny)
+        nx = nx / 5000.0
+        ny = ny / 5000.0
+
+        #Generate noise from both low and high frequency noise:
+        e0 = 1 * gen.noise2d(Freq * nx, Freq * ny)
+        e1 = 0.5 * gen.noise2d(Freq*4*nx, Freq*4*ny)
+        e2 = 0.25 * gen.noise2d(Freq*16*nx, Freq*16*ny)
+        e = e0 + e1 + e2
+
+        return e * 500  #500 meters above/below average...
+
+    def batch(xs, ys):
+        """Return the elevations at arrays of x and y coordinates."""
+        #Same truncation as int(); adding 0.0 turns int()'s -0 into 0.
+        nx = (np.trunc(np.asarray(xs, dtype=float)) + 0.0) / 5000.0
+        ny = (np.trunc(np.asarray(ys, dtype=float)) + 0.0) / 5000.0
+
+        e0 = 1 * gen.noise2d_array(Freq * nx, Freq * ny)
+        e1 = 0.5 * gen.noise2d_array(Freq*4*nx, Freq*4*ny)
+        e2 = 0.25 * gen.noise2d_array(Freq*16*nx, Freq*16*ny)
+        e = e0 + e1 + e2
+
+        return e * 500
+
+    mapFunc.batch = batch
+    return mapFunc
+
+
+def map_heights(mapFunc, xs, ys):
+    """Return mapFunc's elevations at arrays of points.
+
+    Uses mapFunc.batch when the map function has one, and calls mapFunc
+    point by point otherwise.
+    """
+    batch = getattr(mapFunc, 'batch', None)
+    if batch is not None:
+        return batch(xs, ys)
+    xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+    return np.array([mapFunc(x, y) for x, y in zip(xs.ravel().tolist(), ys.ravel().tolist())],
+                    dtype=float).reshape(xs.shape)
+
+
+TILE_SIZE = 256
+
+TERRAIN_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'terrain_cache')
+
+
+class TerrainTileCache(object):
+    """Tiled elevation grid of one map, usable in place of its mapFunc.
+
+    Elevations are rounded to the tile dtype (float32 by default).
+
+    Attributes:
+        hits: lookups of a tile already in memory.
+        loads: tiles memory-mapped from the cache directory.
+        builds: tiles synthesized from noise.
+    """
+
+    def __init__(self, Seed, Freq, cache_dir=TERRAIN_CACHE_DIR, max_tiles=64, dtype=np.float32):
+        """Set up the cache; with cache_dir None tiles are only kept in memory."""
+        self.mapFunc = getMapFunc(Seed, Freq)
+        self.dir = None
+        if cache_dir is not None:
+            self.dir = os.path.join(cache_dir, 'seed_%d_freq_%r_%s' % (Seed, Freq, np.dtype(dtype).name))
+            os.makedirs(self.dir, exist_ok=True)
+        self.max_tiles = max_tiles
+        self.dtype = dtype
+        self.tiles = collections.OrderedDict()
+        self.hits = self.loads = self.builds = 0
+
+    def _build(self, tx, ty):
+        """Synthesize tile (tx, ty); element [i, j] is at x = tx*TILE_SIZE + i, y = ty*TILE_SIZE + j."""
+        cells = np.arange(TILE_SIZE)
+        xs, ys = np.meshgrid(tx * TILE_SIZE + cells, ty * TILE_SIZE + cells, indexing='ij')
+        return self.mapFunc.batch(xs, ys).astype(self.dtype)
+
+    def tile(self, tx, ty):
+        """Return tile (tx, ty), loading or building it if it is not in memory."""
+        key = (tx, ty)
+        tile = self.tiles.get(key)
+        if tile is not None:
+            self.tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+
+        path = None if self.dir is None else os.path.join(self.dir, 'tile_%d_%d.npy' % key)
+        if path is not None and os.path.exists(path):
+            tile = np.load(path, mmap_mode='r')
+            self.loads += 1
+        else:
+            tile = self._build(tx, ty)
+            self.builds += 1
+            if path is not None:
+                #Write to a temporary file first so concurrent runs never see a partial tile.
+                fd, tmp = tempfile.mkstemp(suffix='.npy', dir=self.dir)
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, tile)
+                os.replace(tmp, path)
+
+        self.tiles[key] = tile
+        if len(self.tiles) > self.max_tiles:
+            self.tiles.popitem(last=False)
+        return tile
+
+    def batch(self, xs, ys):
+        """Return the elevations at arrays of x and y coordinates."""
+        xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+        ix = np.trunc(xs).astype(np.int64).ravel()
+        iy = np.trunc(ys).astype(np.int64).ravel()
+        tx, lx = np.divmod(ix, TILE_SIZE)
+        ty, ly = np.divmod(iy, TILE_SIZE)
+
+        keys = (tx << 32) + ty
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if len(first) == 1:
+            return self.tile(int(tx[0]), int(ty[0]))[lx, ly].astype(float).reshape(xs.shape)
+
+        #Read each touched tile in place for the points that fall on it.
+        inverse = inverse.ravel()
+        elevations = np.empty(len(ix))
+        for k, (tile_x, tile_y) in enumerate(zip(tx[first].tolist(), ty[first].tolist())):
+            group = np.flatnonzero(inverse == k)
+            elevations[group] = self.tile(tile_x, tile_y)[lx[group], ly[group]]
+        return elevations.reshape(xs.shape)
+
+    def __call__(self, x, y):
+        return float(self.batch(x, y))
+
+
+SHARED_TERRAIN_RADIUS = 512
+
+
+class SharedTerrain(object):
+    """Exact elevation grid of one map around the origin, in shared memory.
+
+    The grid covers -radius <= x, y < radius and is assembled from float64
+    TerrainTileCache tiles, so a saved cache makes it quick to build.
+    Pickling only sends the name of the shared memory block: processes that
+    receive a SharedTerrain attach to the creator's grid instead of building
+    their own.  Use it like a mapFunc; points off the grid fall back to the
+    noise generator.  The creating process should call close() when done,
+    which also frees the block; the processes it starts share its resource
+    tracker, so they do not free the block when they exit.
+    """
+
+    def __init__(self, Seed, Freq, radius=SHARED_TERRAIN_RADIUS, cache_dir=TERRAIN_CACHE_DIR):
+        """Build the grid in a new shared memory block; radius must be a multiple of TILE_SIZE."""
+        if radius % TILE_SIZE:
+            raise ValueError('radius %d is not a multiple of TILE_SIZE %d' % (radius, TILE_SIZE))
+        size = 2 * radius
+        shm = shared_memory.SharedMemory(create=True, size=size * size * np.dtype(float).itemsize)
+        grid = np.ndarray((size, size), dtype=float, buffer=shm.buf)
+
+        tiles = TerrainTileCache(Seed, Freq, cache_dir, max_tiles=1, dtype=np.float64)
+        for tx in range(-radius // TILE_SIZE, radius // TILE_SIZE):
+            for ty in range(-radius // TILE_SIZE, radius // TILE_SIZE):
+                i = tx * TILE_SIZE + radius
+                j = ty * TILE_SIZE + radius
+                grid[i:i + TILE_SIZE, j:j + TILE_SIZE] = tiles.tile(tx, ty)
+
+        self._attach(Seed, Freq, radius, shm, owner_pid=os.getpid())
+
+    def _attach(self, Seed, Freq, radius, shm, owner_pid):
+        self.seed = Seed
+        self.freq = Freq
+        self.radius = radius
+        self.shm = shm
+        self.owner_pid = owner_pid
+        self.grid = np.ndarray((2 * radius, 2 * radius), dtype=float, buffer=shm.buf)
+        self.grid.flags.writeable = False
+        self.mapFunc = getMapFunc(Seed, Freq)
+
+    def __reduce__(self):
+        return (_attach_shared_terrain, (self.seed, self.freq, self.radius, self.shm.name))
+
+    def close(self):
+        """Detach from the grid, and free it if this is the process that built it."""
+        self.grid = None
+        self.shm.close()
+        #A forked child inherits the creator's object but must not free the block.
+        if self.owner_pid == os.getpid():
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def batch(self, xs, ys):
+        """Return the elevations at arrays of x and y coordinates."""
+        xs, ys = np.broadcast_arrays(np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+        ix = np.trunc(xs) + self.radius
+        iy = np.trunc(ys) + self.radius
+        size = 2 * self.radius
+        inside = (ix >= 0) & (ix < size) & (iy >= 0) & (iy < size)
+
+        heights = np.empty(xs.shape)
+        heights[inside] = self.grid[ix[inside].astype(np.int64), iy[inside].astype(np.int64)]
+        if not inside.all():
+            outside = ~inside
+            heights[outside] = self.mapFunc.batch(xs[outside], ys[outside])
+        return heights
+
+    def __call__(self, x, y):
+        i = int(x) + self.radius
+        j = int(y) + self.radius
+        size = 2 * self.radius
+        if 0 <= i < size and 0 <= j < size:
+            return float(self.grid[i, j])
+        return self.mapFunc(x, y)
+
+
+def _attach_shared_terrain(Seed, Freq, radius, name):
+    """Unpickle a SharedTerrain by attaching to the grid its creator built."""
+    shm = shared_memory.SharedMemory(name=name)
+    terrain = SharedTerrain.__new__(SharedTerrain)
+    terrain._attach(Seed, Freq, radius, shm, owner_pid=None)
+    return terrain
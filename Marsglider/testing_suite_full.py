@@ -24,7 +24,10 @@ import glider
 import multiprocessing as mproc
 import queue
 import traceback
-from opensimplex import OpenSimplex
+import copy
+import os
+import render
+from terrain import getMapFunc, TerrainTileCache
 
 
 TIME_LIMIT = 10  # seconds - Note, if you turn on Verbose Logging 
@@ -40,6 +43,14 @@ PLOT_MAP       = False # False for grading  (True for map coloring in part A )
 		      # (Note: PLOT_MAP requires PLOT_PARTICLES Vizualization!)
 PART_A = True # Enable/disable Part A (Estimation) - True for grading
 PART_B = True # Enable/disable Part B (Steering) - True for grading
+RENDER_FRAMES = None # None for grading (a directory: draw every step offscreen
+                     # to RENDER_FRAMES/partA_case01/frame_00000.png, ... fast
+                     # enough to keep the TIME_LIMIT)
+RENDER_VIDEO = False # With RENDER_FRAMES, write partA_case01.mp4 and so on
+                     # instead (needs ffmpeg; falls back to PNG frames)
+USE_TERRAIN_CACHE = False # False for grading (True gives marsglider.py a
+                          # float32 tile-cached map, saved to disk and reused
+                          # across runs; the simulated glider keeps the exact map)
 
 ########################################################################
 # If your debugger does not handle multiprocess debugging very easily
@@ -48,6 +59,9 @@ PART_B = True # Enable/disable Part B (Steering) - True for grading
 DEBUGGING_SINGLE_PROCESS = False
 
 WINDOW_SIZE = 400   #Size of the window in "units" (actually 2x this...)
+GLIDE_CHUNK = 1     #Part A timesteps simulated at a time - 1 for grading
+                    #(more is faster, but draws the glider's random numbers
+                    # ahead of any that marsglider.py draws itself)
 
 
 #Note for Mac OS High Sierra users having problems with "an error occurred while attempting to obtain endpoint for listener" errors:
@@ -192,27 +206,11 @@ GLOBAL_PARAMETERS = [None,
                       ]
 
 
-#Function that generates the map function....
-def getMapFunc(Seed, Freq):
-   #initialize OpenSimplex one time, use it many times.
-   gen = OpenSimplex(Seed)
-
-   def mapFunc(nx,ny):
-      #Force 1 unit resolution by flooring nx,ny to nearest integer.
-      nx = int(nx)
-      ny = int(ny)
-      nx = nx / 5000.0
-      ny = ny / 5000.0
-
-      #Generate noise from both low and high frequency noise:
-      e0 = 1 * gen.noise2d(Freq * nx, Freq * ny)
-      e1 = 0.5 * gen.noise2d(Freq*4*nx, Freq*4*ny)
-      e2 = 0.25 * gen.noise2d(Freq*16*nx, Freq*16*ny)
-      e = e0 + e1 + e2
-
-      return e * 500  #500 meters above/below average...
-
-   return mapFunc
+def getStudentMapFunc(Seed, Freq):
+   """Map function handed to the student code."""
+   if USE_TERRAIN_CACHE:
+      return TerrainTileCache(Seed, Freq)
+   return getMapFunc(Seed, Freq)
 
 def getMapColor( h, hmin, hmax ):
    cmin = 128
@@ -238,8 +236,14 @@ class GliderSimulator(object):
         glider_steps(Queue): synchronized queue to store glider steps.
         glider_found(Queue): synchronized queue to store if glider located.
         glider_error(Queue): synchronized queue to store exception messages.
+        maps(dict): (map_seed, map_freq) -> shared map function to use instead
+            of building the map for each test.
+        glide_chunk(int): Part A timesteps to simulate at a time.
     """
-    def __init__(self):
+    def __init__(self, maps=None, glide_chunk=GLIDE_CHUNK):
+
+        self.maps = maps if maps is not None else {}
+        self.glide_chunk = glide_chunk
 
         if DEBUGGING_SINGLE_PROCESS:
 
@@ -265,6 +269,33 @@ class GliderSimulator(object):
         while not self.glider_error.empty():
             self.glider_found.get()
 
+    def map_funcs(self, params):
+        """Return our map function and the student's for a test.
+
+        Args:
+            params(dict): Test parameters.
+        """
+        key = (params['map_seed'], params['map_freq'])
+        if key in self.maps:
+            #A copy attaches to the same shared map as a separate object.
+            return self.maps[key], copy.copy(self.maps[key])
+
+        #Student function is separate, so they can mess it up if they want.
+        return getMapFunc(*key), getStudentMapFunc(*key)
+
+    @staticmethod
+    def renderer(params):
+        """Return a GliderRenderer for a test if RENDER_FRAMES is set, else None.
+
+        Args:
+            params(dict): Test parameters.
+        """
+        if not RENDER_FRAMES:
+            return None
+        path = os.path.join(RENDER_FRAMES, 'part{}_case{:02d}'.format(params['part'], params['test_case']))
+        return render.GliderRenderer(TerrainTileCache(params['map_seed'], params['map_freq']),
+                                     render.frame_writer(path, RENDER_VIDEO), WINDOW_SIZE)
+
     @staticmethod
     def distance(p, q):
         """Calculate the distance between two points.
@@ -311,9 +342,8 @@ class GliderSimulator(object):
         #make the test somewhat repeatable by seeding the RNG.
         random.seed(params['map_seed'])
 
-        ourMapFunc = getMapFunc( params['map_seed'], params['map_freq'])
-        #Student function is separate, so they can mess it up if they want.
-        studentMapFunc = getMapFunc( params['map_seed'], params['map_freq'] )
+        ourMapFunc, studentMapFunc = self.map_funcs(params)
+        renderer = self.renderer(params)
 
         target = glider.glider(params['target_x'],
                              params['target_y'],
@@ -363,8 +393,16 @@ class GliderSimulator(object):
 
         try:
             while steps < params['max_steps']:
-                target_meas = target.sense()
-                target_height = target.get_height()
+                if self.glide_chunk > 1:
+                   if steps % self.glide_chunk == 0:
+                      #Part A never steers, so simulate the glider a chunk of
+                      #timesteps at a time (with the same random numbers,
+                      #drawn ahead of any the student code draws).
+                      readings = list(zip(*target.glide_many(min(self.glide_chunk, params['max_steps'] - steps))))
+                   target_meas, target_height, x, y, z, heading = readings[steps % self.glide_chunk]
+                else:
+                   target_meas = target.sense()
+                   target_height = target.get_height()
 
                 result = estimate_next_pos(target_height,target_meas, studentMapFunc, other_info)
 
@@ -377,8 +415,13 @@ class GliderSimulator(object):
                    print("estimate_next_pos did not return correct number of return values!")
 
 		#Calculate the actual position of the target next timestep.
-                target = target.glide()
-                target_pos = (target.x, target.y)
+                if self.glide_chunk <= 1:
+                   target.glide(in_place=True)
+                   x, y, z, heading = target.x, target.y, target.z, target.heading
+                target_pos = (x, y)
+
+                if renderer is not None:
+                   renderer.draw(target_pos, estimate, extra_points)
 
                 if PLOT_PARTICLES == True and extra_points != None:
 
@@ -442,7 +485,7 @@ class GliderSimulator(object):
                        target_turtle.penup()
 
                    target_turtle.setposition(target_pos[0], target_pos[1])
-                   target_turtle.settiltangle( target.heading * 180 / math.pi )
+                   target_turtle.settiltangle( heading * 180 / math.pi )
                    target_turtle.showturtle()
 
                    #Draw the student estimate of the glider
@@ -472,8 +515,8 @@ class GliderSimulator(object):
                 steps += 1
 
                 if VERBOSE == True:
-                   actual_height = target.z
-                   ground_height = ourMapFunc(target.x, target.y)
+                   actual_height = z
+                   ground_height = ourMapFunc(x, y)
                    actual_dist_to_ground = actual_height - ground_height 
                    print("\nStep: {} Actual ({})  predicted: ({})\n  Difference = {}\n  Height={}, Ground Height = {} Dist To Ground = {}".format( steps, target_pos, estimate, separation, actual_height, ground_height, actual_dist_to_ground)) 
                    if extra_points != None and len(extra_points) > 0:
@@ -493,6 +536,10 @@ class GliderSimulator(object):
         except:
             self.glider_error.put(traceback.format_exc())
 
+        finally:
+            if renderer is not None:
+                renderer.close()
+
     def simulate_with_steering(self, next_angle, params):
         """Run simulation to allow glider to be steered.
 
@@ -508,9 +555,8 @@ class GliderSimulator(object):
         #make the test somewhat repeatable by seeding the RNG.
         random.seed(params['map_seed'])
 
-        ourMapFunc = getMapFunc( params['map_seed'], params['map_freq'])
-        #Student function is separate, so they can mess it up if they want.
-        studentMapFunc = getMapFunc( params['map_seed'], params['map_freq'] )
+        ourMapFunc, studentMapFunc = self.map_funcs(params)
+        renderer = self.renderer(params)
 
         target = glider.glider(params['target_x'],
                                params['target_y'],
@@ -593,11 +639,14 @@ class GliderSimulator(object):
                 steering = max( -PI/8.0, steering)
                 steering = min( steering, PI/8.0)
 
-                target = target.glide(steering)
+                target.glide(steering, in_place=True)
 
                 target_pos = (target.x, target.y)
                 separation = self.distance( (0,0) , target_pos)
 
+                if renderer is not None:
+                   renderer.draw(target_pos, None, extra_points)
+
                 if PLOT_PARTICLES == True:
 
                    if extra_points != None:
@@ -662,6 +711,10 @@ class GliderSimulator(object):
         except:
             self.glider_error.put(traceback.format_exc())
 
+        finally:
+            if renderer is not None:
+                renderer.close()
+
 
 NOT_FOUND = "Part {} - Test Case {}: glider took {} step(s) which exceeded the {} allowable step(s)."
 
@@ -0,0 +1,61 @@
+"""Columnar storage for large Meteorites test cases.
+
+A case is a directory holding params.json, with every parameter except the
+meteorites, and meteorites.npy, a structured array with one float32 column
+per motion coefficient.  meteorites.npy is memory-mapped on load, so even
+cases with millions of meteorites open instantly.
+"""
+
+import json
+import os
+
+import numpy as np
+
+PARAMS_FILE = 'params.json'
+METEORITES_FILE = 'meteorites.npy'
+
+METEORITE_DTYPE = np.dtype([('a_x', '<f4'),
+                            ('b_x', '<f4'),
+                            ('c_x', '<f4'),
+                            ('a_y', '<f4'),
+                            ('b_y', '<f4'),
+                            ('c_y', '<f4'),
+                            ('t_start', '<i4'),
+                            ('id', '<i8')])
+
+
+def columns_from_meteorites(meteorites):
+    """Convert a list of meteorite parameter dicts to a structured array."""
+    columns = np.zeros(len(meteorites), dtype=METEORITE_DTYPE)
+    for name in METEORITE_DTYPE.names:
+        columns[name] = [m[name] for m in meteorites]
+    return columns
+
+
+def is_case_dir(path):
+    """Return True if path is a columnar case directory."""
+    return os.path.isfile(os.path.join(str(path), METEORITES_FILE))
+
+
+def save_case(dirname, params, columns):
+    """Write params (without 'meteorites') and the meteorite columns to dirname."""
+    os.makedirs(dirname, exist_ok=True)
+    np.save(os.path.join(dirname, METEORITES_FILE),
+            np.asarray(columns, dtype=METEORITE_DTYPE))
+
+    header = {k: v for k, v in params.items() if k != 'meteorites'}
+    with open(os.path.join(dirname, PARAMS_FILE), 'w') as f:
+        json.dump(header, f, indent=2)
+
+
+def load_case(dirname):
+    """Load a case saved by save_case.
+
+    Returns the params dict with the memory-mapped meteorite columns under
+    'meteorite_columns' in place of the 'meteorites' list.
+    """
+    with open(os.path.join(dirname, PARAMS_FILE)) as f:
+        params = json.load(f)
+    params['meteorite_columns'] = np.load(os.path.join(dirname, METEORITES_FILE),
+                                          mmap_mode='r')
+    return params
@@ -19,6 +19,7 @@ from meteorite import Meteorite, MeteorShower
 from arena import FIELD_X_BOUNDS, FIELD_Y_BOUNDS
 import arena
 from turret import Turret
+import case_store
 
 
 INITIAL_LASER_STATE = {"h": np.pi * 0.5,
@@ -153,6 +154,78 @@ class MeteorShowerGenerator(object):
         return MeteorShower(arena, self.seed, P_HIT, meteorites, turret,
                             min_dist)
 
+
+class BulkMeteorShowerGenerator(object):
+    """Vectorized MeteorShowerGenerator for very large cases.
+
+    Draws the same coefficient distributions as MeteorShowerGenerator, but
+    for every meteorite at once, and returns case_store columns instead of
+    Meteorite objects.
+    """
+
+    MAX_REDRAWS = 1000
+
+    def __init__(self, seed):
+        """Initialize a generator for meteorite coefficient columns."""
+        self.rng = np.random.default_rng(seed & 0xFFFFFFFFFFFFFFFF)
+        self.seed = seed
+
+    def generate_columns(self, t_past, t_future, t_step, per_step,
+                         arena,
+                         a_max=0.00001,
+                         b_max=0.01,
+                         cy_bounds=(-0.8, 1.0)):
+        """Generate per_step meteorites every t_step-th time step."""
+        # same start steps as MeteorShowerGenerator: multiples of t_step
+        first_step = -(-t_past // t_step) * t_step
+        t_start = np.repeat(np.arange(first_step, t_future, t_step), per_step)
+        n = len(t_start)
+        x_bound_coe = 0.05
+
+        columns = np.zeros(n, dtype=case_store.METEORITE_DTYPE)
+        columns['t_start'] = t_start
+        columns['id'] = 1001 + np.arange(n)
+
+        # alternate right and left entry sides as MeteorShowerGenerator does
+        left = (np.arange(n) % 2) == 1
+        bx_low = np.where(left, 0.0, -b_max * x_bound_coe)
+        bx_high = np.where(left, b_max * x_bound_coe, 0.0)
+        cx_low = np.where(left, -0.9, 0.0)
+        cx_high = np.where(left, 0.0, 0.9)
+
+        redraw = np.arange(n)
+        for _ in range(self.MAX_REDRAWS):
+            if not len(redraw):
+                break
+            m = len(redraw)
+            a_x = self.rng.uniform(-a_max * x_bound_coe, a_max * x_bound_coe, m)
+            b_x = self.rng.uniform(bx_low[redraw], bx_high[redraw])
+            c_x = self.rng.uniform(cx_low[redraw], cx_high[redraw])
+            a_y = self.rng.uniform(-a_max, TEENSY_COEFFICIENT, m)
+            b_y = self.rng.uniform(-b_max, TEENSY_COEFFICIENT, m)
+            c_y = self.rng.uniform(cy_bounds[0], cy_bounds[1], m)
+
+            for name, values in (('a_x', a_x), ('b_x', b_x), ('c_x', c_x),
+                                 ('a_y', a_y), ('b_y', b_y), ('c_y', c_y)):
+                columns[name][redraw] = values
+
+            # same rejection test as meteorite_init_location_bad
+            t = -t_start[redraw]
+            x = a_x * t * t + b_x * t + c_x
+            y = a_y * t * t + b_y * t + c_y
+            bad = (x <= arena.x_bounds[0]) | (x >= arena.x_bounds[1]) | (y < 0.0)
+            redraw = redraw[bad]
+
+        if len(redraw):
+            raise RuntimeError('could not place %d meteorites inside the arena' % len(redraw))
+
+        return columns
+
+
+# Options of the bulk generator only, left out of the params module's _args
+BULK_ONLY_ARGS = ('columns', 'per_step')
+
+
 def args_as_dict(args):
     if isinstance(args, dict):
         return args
@@ -202,11 +275,43 @@ def params(args):
             "min_dist": my_args.min_dist,
             "noise_sigma": my_args.noise_sigma,
             "nsteps": my_args.nsteps,
-            "_args": vars(my_args)}
+            "_args": {k: v for k, v in vars(my_args).items()
+                      if k not in BULK_ONLY_ARGS}}
+
+
+def bulk_params(args):
+    """Process arguments and generate columnar meteorites for a large case."""
+    my_args = args_as_namespace(args)
+
+    columns = BulkMeteorShowerGenerator(seed=my_args.seed).generate_columns(
+        t_past=my_args.t_past,
+        t_future=my_args.t_future,
+        t_step=my_args.t_step,
+        per_step=my_args.per_step,
+        arena=arena.Arena(),
+        a_max=my_args.meteorite_a_max,
+        b_max=my_args.meteorite_b_max,
+        cy_bounds=(my_args.meteorite_y_min, my_args.meteorite_y_max))
+
+    laser_state = {'h': math.pi * 0.5,
+                   'hp': my_args.turret_hp}
+
+    return {"initial_laser_state": laser_state,
+            "in_bounds": dict(IN_BOUNDS),
+            "min_dist": my_args.min_dist,
+            "noise_sigma": my_args.noise_sigma,
+            "nsteps": my_args.nsteps,
+            "_args": vars(my_args)}, columns
 
 
 def main(args):
     """Set up parameters and run the simulation."""
+    if args.columns:
+        p, columns = bulk_params(args=args)
+        case_store.save_case(args.outfile, p, columns)
+        print("Wrote %s (%d meteorites)" % (args.outfile, len(columns)))
+        return
+
     p = params(args=args)
 
     f = open(args.outfile, 'w')
@@ -277,6 +382,13 @@ def parser():
                       help="random seed to use when generating meteorites",
                       type=int,
                       default=0)
+    prsr.add_argument("--columns",
+                      help="write outfile as a columnar case directory (see case_store.py) using the bulk generator",
+                      action="store_true")
+    prsr.add_argument("--per_step",
+                      help="with --columns, number of meteorites added every t_step-th time step",
+                      type=int,
+                      default=1)
     return prsr
 
 
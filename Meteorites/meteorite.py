@@ -11,7 +11,6 @@
 from builtins import object
 import numpy as np
 import math
-import random
 
 
 def right_angle_dist_to_line(line_pt_0, line_pt_1, point):
@@ -77,7 +76,15 @@ class Meteorite(object):
 
 
 class MeteorShower(object):
-    """A collection of Meteorites."""
+    """A collection of Meteorites.
+
+    The motion coefficients, start times and ids of all meteorites are
+    kept as NumPy columns so every trajectory is evaluated at once per
+    timestep.  A deactivated meteorite has id -1 in the ids column.
+
+    Laser hit rolls are drawn from a random stream seeded by (seed, time),
+    so the outcome of a timestep does not depend on earlier timesteps.
+    """
 
     def __init__(self, thearena, seed, p_hit, meteorites, turret, margin):
         """Initialize the collection of Meteorites."""
@@ -88,9 +95,53 @@ class MeteorShower(object):
         self.turret = turret
         self.turret_pos = np.array([turret.x_pos, turret.y_pos])
         self.margin = margin
-        self.random_state = random.Random(seed)
+        self.seed = seed
         self.p_hit = p_hit
 
+        self.a_x = np.array([m.a_x for m in meteorites], dtype=float)
+        self.b_x = np.array([m.b_x for m in meteorites], dtype=float)
+        self.c_x = np.array([m.c_x for m in meteorites], dtype=float)
+        self.a_y = np.array([m.a_y for m in meteorites], dtype=float)
+        self.b_y = np.array([m.b_y for m in meteorites], dtype=float)
+        self.c_y = np.array([m.c_y for m in meteorites], dtype=float)
+        self.t_start = np.array([m.t_start for m in meteorites], dtype=float)
+        self.ids = np.array([m.id for m in meteorites], dtype=np.int64)
+
+    @classmethod
+    def from_columns(cls, thearena, seed, p_hit, columns, turret, margin):
+        """Create a MeteorShower straight from coefficient columns.
+
+        columns maps 'a_x', 'b_x', 'c_x', 'a_y', 'b_y', 'c_y', 't_start'
+        and 'id' to arrays, e.g. a memory-mapped case from case_store.
+        The coefficient columns are used as given, without copying, and
+        no Meteorite objects are created.
+        """
+        shower = cls(thearena, seed, p_hit, [], turret, margin)
+        for name in ('a_x', 'b_x', 'c_x', 'a_y', 'b_y', 'c_y'):
+            setattr(shower, name, columns[name])
+        shower.t_start = np.asarray(columns['t_start'], dtype=float)
+        shower.ids = np.array(columns['id'], dtype=np.int64)
+        return shower
+
+    def xy_positions(self, time):
+        """Return the x and y positions of all meteorites as arrays."""
+        t_shifted = time - self.t_start
+
+        x_pos = ((self.a_x * t_shifted * t_shifted)
+                 + (self.b_x * t_shifted)
+                 + self.c_x)
+
+        y_pos = ((self.a_y * t_shifted * t_shifted)
+                 + (self.b_y * t_shifted)
+                 + self.c_y)
+        return x_pos, y_pos
+
+    def deactivate(self, rows):
+        """Deactivate the meteorites in the given rows."""
+        self.ids[rows] = -1
+        if self.meteorites:
+            for row in np.atleast_1d(rows):
+                self.meteorites[row].deactivate()
 
     def meteorite_locations(self, time):
         """Return the meteorites' locations.
@@ -98,61 +149,67 @@ class MeteorShower(object):
         This returns a list of tuples, each of which contains a specific
         meteorite's index, x-position, and y-position.
         """
-        locs = []
-        for i, meteorite in enumerate(self.meteorites):
-            if meteorite.t_start <= time:
-                xyloc = meteorite.xy_pos(time)
-                if self.arenacontains((xyloc[0], xyloc[1])):
-                    locs.append((meteorite.id, xyloc[0], xyloc[1]))
+        x_pos, y_pos = self.xy_positions(time)
+        visible = np.flatnonzero((self.t_start <= time)
+                                 & (self.x_bounds[0] <= x_pos) & (x_pos <= self.x_bounds[1])
+                                 & (self.y_bounds[0] <= y_pos) & (y_pos <= self.y_bounds[1]))
 
-        return locs
+        return list(zip(self.ids[visible].tolist(),
+                        x_pos[visible].tolist(),
+                        y_pos[visible].tolist()))
 
     def laser_or_ground_hit(self, time, laser_heading_rad, laser_on):
         """Delete meteorites that hit the ground or were hit by the laser."""
-        health_losses = [0]
         laser_line = [self.turret.x_pos + math.cos(laser_heading_rad),
                       self.turret.y_pos + math.sin(laser_heading_rad)]
-        for meteorite in self.meteorites:
-            if meteorite.id < 0:
-                continue
-            # check for ground hits
-            if meteorite.xy_pos(time)[1] < self.turret.y_pos:
-                meteorite.deactivate()
-                if self.x_bounds[0] < meteorite.xy_pos(time)[0] < self.x_bounds[1]:
-                    health_losses.append(1)
-            if laser_on:
-                if self.check_for_laser_hit(time, laser_line,
-                                            laser_heading_rad,
-                                            meteorite.xy_pos(time)):
-                    meteorite.deactivate()
-        return np.sum(health_losses)
-
-    def check_for_laser_hit(self, time, laser_line, laser_hdg_rad,
-                            meteorite_pos):
-        """Return True if meteorite hit by laser, False otherwise."""
-        same_side = False
-        if laser_hdg_rad > 0.5*math.pi and laser_hdg_rad <= math.pi:
+        x_pos, y_pos = self.xy_positions(time)
+        live = np.flatnonzero(self.ids >= 0)
+
+        # check for ground hits
+        ground = live[y_pos[live] < self.turret.y_pos]
+        health_loss = np.count_nonzero((self.x_bounds[0] < x_pos[ground])
+                                       & (x_pos[ground] < self.x_bounds[1]))
+        self.deactivate(ground)
+
+        if laser_on:
+            hits = self.check_for_laser_hits(time, laser_line,
+                                             laser_heading_rad,
+                                             x_pos[live], y_pos[live])
+            self.deactivate(live[hits])
+        return health_loss
+
+    def step_random_state(self, time):
+        """Return the random stream used for laser hits at this timestep."""
+        # SeedSequence rejects negative entries; seeds are taken modulo 2**64
+        return np.random.default_rng([self.seed & 0xFFFFFFFFFFFFFFFF, time])
+
+    def check_for_laser_hits(self, time, laser_line, laser_hdg_rad,
+                             x_pos, y_pos):
+        """Return a boolean array, True where a meteorite is hit by the laser."""
+        offset = self.turret.x_pos - x_pos
+        if 0.5*math.pi < laser_hdg_rad <= math.pi:
             # laser turret aimed in the left half of the arena
-            if (self.turret.x_pos - meteorite_pos[0]) > 0:
-                same_side = True
-        elif laser_hdg_rad < 0.5*math.pi and laser_hdg_rad >= 0.0:
+            same_side = offset > 0
+        elif 0.0 <= laser_hdg_rad < 0.5*math.pi:
             # laser turret aimed in the right half of the arena
-            if (self.turret.x_pos - meteorite_pos[0]) < 0:
-                same_side = True
+            same_side = offset < 0
         elif laser_hdg_rad == 0.5*math.pi:
             # laser points straight up, so check whether meteorite is within a
             # small distance of the laser pointing straight up
-            if abs((self.turret.x_pos - meteorite_pos[0]) < self.margin):
-                same_side = True
-
-        if same_side and abs(right_angle_dist_to_line((self.turret.x_pos,
-                                                       self.turret.y_pos),
-                             laser_line, meteorite_pos)) < self.margin:
-            if not meteorite_pos[0] > self.turret.x_pos > laser_line[0] or \
-                    not meteorite_pos[0] < self.turret.x_pos < laser_line[0]:
-                if self.random_state.random() <= self.p_hit:
-                    return True
-        return False
+            same_side = offset < self.margin
+        else:
+            same_side = np.zeros(len(x_pos), dtype=bool)
+
+        near_line = np.abs(right_angle_dist_to_line(
+            (self.turret.x_pos, self.turret.y_pos), laser_line,
+            (x_pos, y_pos))) < self.margin
+        in_front = (~((x_pos > self.turret.x_pos) & (self.turret.x_pos > laser_line[0]))
+                    | ~((x_pos < self.turret.x_pos) & (self.turret.x_pos < laser_line[0])))
+
+        candidates = np.flatnonzero(same_side & near_line & in_front)
+        hits = np.zeros(len(x_pos), dtype=bool)
+        hits[candidates] = self.step_random_state(time).random(len(candidates)) <= self.p_hit
+        return hits
 
     def check_for_ground_hit(self, time, ground_y, meteorite):
         """Return -1 if the meteorite hits the ground and will deduct health.
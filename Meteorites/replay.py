@@ -0,0 +1,258 @@
+"""Record defense runs and replay them against a Turret.
+
+A log is an append-only binary file holding any number of runs.  Every
+record starts with a one byte tag:
+
+    b'R'  start of a run: uint32 length, then the run parameters as JSON
+    b'S'  one timestep: the STEP_HEADER fields, then the observation ids
+          (int64), observation x, y (float64 pairs), estimate ids (int64)
+          and estimate x, y (float64 pairs)
+    b'E'  end of a run: uint32 length, then the result as JSON
+
+The replayer feeds the recorded observations and laser angles to a fresh
+Turret and compares its estimates and laser actions to the recorded ones.
+The meteor shower is not simulated again, so a replay only costs the
+turret's own time.
+
+    python replay.py record --case 1 --case 2 --log runs.bin
+    python replay.py replay runs.bin
+"""
+
+import argparse
+import collections
+import json
+import struct
+import sys
+import time
+
+import numpy as np
+
+import arena
+import runner
+from turret import Turret
+
+RUN_TAG = b'R'
+STEP_TAG = b'S'
+END_TAG = b'E'
+
+# t, health, laser angle, action kind, action value, observation count,
+# estimate count
+STEP_HEADER = struct.Struct('<iddBdII')
+LENGTH = struct.Struct('<I')
+
+ACTION_NONE = 0
+ACTION_TURN = 1
+ACTION_FIRE = 2
+ACTION_OTHER = 3
+
+ReplayStep = collections.namedtuple('ReplayStep',
+                                    ('t', 'health', 'laser_angle',
+                                     'action_kind', 'action_value',
+                                     'obs_ids', 'obs_xy', 'est_ids', 'est_xy'))
+
+ReplayRun = collections.namedtuple('ReplayRun', ('params', 'steps', 'result'))
+
+
+def encode_action(laser_action):
+    """Return the (kind, value) of a laser action returned by a Turret."""
+    if laser_action is None:
+        return ACTION_NONE, 0.0
+    if isinstance(laser_action, (float, int)):
+        return ACTION_TURN, float(laser_action)
+    if isinstance(laser_action, str) and 'fire' in laser_action.lower():
+        return ACTION_FIRE, 0.0
+    return ACTION_OTHER, 0.0
+
+
+def _columns(locations):
+    """Split (i, x, y) triples into int64 ids and an (n, 2) float64 array."""
+    locs = runner.estimate_array(locations)
+    return locs[:, 0].astype(np.int64), np.ascontiguousarray(locs[:, 1:])
+
+
+class ReplayRecorder(object):
+    """Append defense runs to a replay log.
+
+    Pass an instance as the recorder argument of runner.run_defense.
+    """
+
+    def __init__(self, filename):
+        self.fout = open(filename, 'ab')
+
+    def _write_json(self, tag, obj):
+        data = json.dumps(obj).encode('utf-8')
+        self.fout.write(tag + LENGTH.pack(len(data)) + data)
+
+    def begin_run(self, **params):
+        self._write_json(RUN_TAG, params)
+
+    def record_step(self, t, observations, estimates, laser_angle,
+                    laser_action, health):
+        obs_ids, obs_xy = _columns(observations)
+        est_ids, est_xy = _columns(estimates)
+        kind, value = encode_action(laser_action)
+        self.fout.write(b''.join((STEP_TAG,
+                                  STEP_HEADER.pack(t, health, laser_angle, kind, value,
+                                                   len(obs_ids), len(est_ids)),
+                                  obs_ids.tobytes(), obs_xy.tobytes(),
+                                  est_ids.tobytes(), est_xy.tobytes())))
+
+    def end_run(self, retcode, t):
+        self._write_json(END_TAG, {'retcode': retcode, 't': t})
+
+    def close(self):
+        self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_log(filename):
+    """Yield the ReplayRuns in a replay log.
+
+    The arrays in each ReplayStep are read-only views of the file contents.
+    A run cut short by an interrupted recording has result None.
+    """
+    with open(filename, 'rb') as f:
+        buf = f.read()
+
+    run = None
+    pos = 0
+    while pos < len(buf):
+        tag = buf[pos:pos + 1]
+        pos += 1
+        if tag == STEP_TAG:
+            t, health, angle, kind, value, n_obs, n_est = STEP_HEADER.unpack_from(buf, pos)
+            pos += STEP_HEADER.size
+            arrays = []
+            for n in (n_obs, n_est):
+                ids = np.frombuffer(buf, dtype=np.int64, count=n, offset=pos)
+                pos += ids.nbytes
+                xy = np.frombuffer(buf, dtype=np.float64, count=2 * n, offset=pos).reshape(n, 2)
+                pos += xy.nbytes
+                arrays += [ids, xy]
+            run.steps.append(ReplayStep(t, health, angle, kind, value, *arrays))
+        elif tag in (RUN_TAG, END_TAG):
+            length, = LENGTH.unpack_from(buf, pos)
+            pos += LENGTH.size
+            obj = json.loads(buf[pos:pos + length].decode('utf-8'))
+            pos += length
+            if tag == RUN_TAG:
+                if run is not None:
+                    yield run
+                run = ReplayRun(obj, [], None)
+            else:
+                yield run._replace(result=obj)
+                run = None
+        else:
+            raise ValueError('corrupt replay log %s at byte %d' % (filename, pos - 1))
+
+    if run is not None:
+        yield run
+
+
+def default_turret(params):
+    """Create the Turret used by test_one for a recorded run."""
+    return Turret(params['turret_pos'], arena.Arena().contains,
+                  params['max_angle_change'], params['initial_laser_state'])
+
+
+def replay_run(run, turret_factory=default_turret, tolerance=1e-9):
+    """Drive a fresh turret with the observations of a recorded run.
+
+    Returns a dict with the number of steps replayed, the time spent in the
+    turret, and the first timesteps whose estimates or laser actions differ
+    from the recording (None if they all agree).
+    """
+    turret = turret_factory(run.params)
+    est_diff = action_diff = None
+    elapsed = 0.0
+
+    for step in run.steps:
+        observations = tuple(zip(step.obs_ids.tolist(),
+                                 step.obs_xy[:, 0].tolist(),
+                                 step.obs_xy[:, 1].tolist()))
+
+        start = time.perf_counter()
+        estimates = turret.observe_and_estimate(observations)
+        laser_action = None
+        if step.action_kind != ACTION_NONE:
+            laser_action = turret.get_laser_action(step.laser_angle)
+        elapsed += time.perf_counter() - start
+
+        if est_diff is None:
+            est_ids, est_xy = _columns(estimates)
+            if (not np.array_equal(est_ids, step.est_ids)
+                    or not np.allclose(est_xy, step.est_xy, rtol=0.0, atol=tolerance)):
+                est_diff = step.t
+
+        if action_diff is None:
+            kind, value = encode_action(laser_action)
+            if kind != step.action_kind or abs(value - step.action_value) > tolerance:
+                action_diff = step.t
+
+    return {'steps': len(run.steps),
+            'turret_time': elapsed,
+            'first_estimate_diff': est_diff,
+            'first_action_diff': action_diff}
+
+
+def record(case_ids, filename):
+    """Run defense on the given cases and append them to a replay log."""
+    from test_one import load_params, run_kwargs
+
+    with ReplayRecorder(filename) as recorder:
+        for case_id in case_ids:
+            retcode, t = runner.run_defense(recorder=recorder,
+                                            **run_kwargs(load_params(case_id)))
+            sys.stdout.write('case %s: %s at t %d\n' % (case_id, retcode, t))
+
+
+def replay(filename, tolerance):
+    """Replay every run in a log and report where the turret diverges."""
+    runs = total_steps = diverged = 0
+    total_time = 0.0
+    for run in read_log(filename):
+        stats = replay_run(run, tolerance=tolerance)
+        runs += 1
+        total_steps += stats['steps']
+        total_time += stats['turret_time']
+        if stats['first_estimate_diff'] is not None or stats['first_action_diff'] is not None:
+            diverged += 1
+        sys.stdout.write('run %d: %d steps, %.3fs, estimates differ from t %s, '
+                         'actions differ from t %s, recorded %s\n'
+                         % (runs, stats['steps'], stats['turret_time'],
+                            stats['first_estimate_diff'], stats['first_action_diff'],
+                            run.result))
+
+    sys.stdout.write('%d runs, %d diverged, %d steps in %.2fs of turret time\n'
+                     % (runs, diverged, total_steps, total_time))
+    return diverged
+
+
+def parser():
+    """Parse command-line arguments."""
+    prsr = argparse.ArgumentParser()
+    sub = prsr.add_subparsers(dest='command', required=True)
+
+    rec = sub.add_parser('record', help='run defense cases and append them to a log')
+    rec.add_argument('--case', help='case number, case file or case directory',
+                     action='append', required=True)
+    rec.add_argument('--log', help='replay log to append to', required=True)
+
+    rep = sub.add_parser('replay', help='replay a log against the current turret')
+    rep.add_argument('log', help='replay log to read')
+    rep.add_argument('--tolerance', help='allowed difference in estimates and angles',
+                     type=float, default=1e-9)
+    return prsr
+
+
+if __name__ == '__main__':
+    args = parser().parse_args()
+    if args.command == 'record':
+        record(args.case, args.log)
+    else:
+        sys.exit(1 if replay(args.log, args.tolerance) else 0)
@@ -12,8 +12,12 @@
 
 from builtins import range
 from builtins import object
+import json
 import math
 import random
+import time
+
+import numpy as np
 
 NUM_STEPS_GOOD_EST_REQUIRED = 5
 ESTIMATE_ACCURACY_THRESHOLD = 0.9
@@ -43,7 +47,13 @@ def clamp(value, lower, upper):
 
 
 class BaseRunnerDisplay(object):
-    """Base class for procedure runners."""
+    """Base class for procedure runners.
+
+    Displays which do nothing with individual meteorites set draws_items
+    to False, and the runners then skip the per-meteorite calls.
+    """
+
+    draws_items = True
 
     def setup(self, x_bounds, y_bounds,
               in_bounds,
@@ -70,6 +80,9 @@ class BaseRunnerDisplay(object):
     def turret_at_loc(self, h, laser_len=None):
         pass
 
+    def turret_health(self, hp, hp0):
+        pass
+
     def laser_target_heading(self, rad, laser_len):
         pass
 
@@ -86,6 +99,87 @@ class BaseRunnerDisplay(object):
         pass
 
 
+class NullRunnerDisplay(BaseRunnerDisplay):
+    """Display used when no display is attached to a runner."""
+
+    draws_items = False
+
+
+class NullStepProfiler(object):
+    """Profiler used when no profiler is attached to a runner."""
+
+    def call(self, name, t, fcn, *args):
+        """Return fcn(*args)."""
+        return fcn(*args)
+
+
+class StepProfiler(NullStepProfiler):
+    """Measure the time spent in the turret and meteor shower per timestep.
+
+    Pass an instance as the profiler argument of run_estimation or
+    run_defense, then print format_summary() or write a Chrome trace
+    (chrome://tracing, Perfetto) with write_trace().
+    """
+
+    # Upper edges, in seconds, of the histogram buckets in the summary
+    HISTOGRAM_EDGES = (1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1.0)
+
+    def __init__(self):
+        self.durations = {}
+        self.events = []
+
+    def call(self, name, t, fcn, *args):
+        """Return fcn(*args), recording how long it took under name."""
+        start = time.perf_counter()
+        ret = fcn(*args)
+        duration = time.perf_counter() - start
+        self.durations.setdefault(name, []).append(duration)
+        self.events.append((name, t, start, duration))
+        return ret
+
+    def summary(self):
+        """Return per-section call counts, totals, percentiles and histograms."""
+        ret = {}
+        edges = np.array((0.0,) + self.HISTOGRAM_EDGES + (np.inf,))
+        for name, durations in self.durations.items():
+            d = np.array(durations)
+            ret[name] = {'count': len(d),
+                         'total': d.sum(),
+                         'mean': d.mean(),
+                         'p50': np.percentile(d, 50),
+                         'p90': np.percentile(d, 90),
+                         'p99': np.percentile(d, 99),
+                         'max': d.max(),
+                         'histogram': np.histogram(d, edges)[0].tolist()}
+        return ret
+
+    def format_summary(self):
+        """Return the summary as a table, with times in milliseconds."""
+        labels = ['<%gms' % (1e3 * e) for e in self.HISTOGRAM_EDGES] + ['more']
+        lines = ['{0:>22} {1:>6} {2:>9} {3:>8} {4:>8} {5:>8} {6:>8} {7:>8}  {8}'.format(
+            'section', 'calls', 'total', 'mean', 'p50', 'p90', 'p99', 'max', ' '.join(labels))]
+        for name, s in self.summary().items():
+            lines.append('{0:>22} {1:6d} {2:9.1f} {3:8.3f} {4:8.3f} {5:8.3f} {6:8.3f} {7:8.3f}  {8}'.format(
+                name, s['count'], 1e3 * s['total'], 1e3 * s['mean'], 1e3 * s['p50'],
+                1e3 * s['p90'], 1e3 * s['p99'], 1e3 * s['max'],
+                ' '.join('%*d' % (len(label), n) for label, n in zip(labels, s['histogram']))))
+        return '\n'.join(lines)
+
+    def write_trace(self, filename):
+        """Write the recorded calls as Chrome trace event JSON."""
+        origin = self.events[0][2] if self.events else 0.0
+        events = [{'name': name,
+                   'ph': 'X',
+                   'ts': 1e6 * (start - origin),
+                   'dur': 1e6 * duration,
+                   'pid': 0,
+                   'tid': 0,
+                   'args': {'t': t}}
+                  for name, t, start, duration in self.events]
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
 SUCCESS = 'success'
 FAILURE_TOO_MANY_STEPS = 'too_many_steps'
 
@@ -97,14 +191,14 @@ def add_observation_noise(meteorite_locations, noise_sigma=0.0,
                           random_state=None):
     """Add noise to meteorite observations."""
     my_random_state = random_state if random_state else random.Random(0)
-    ret = ()
+    ret = []
     for i, x, y in meteorite_locations:
         err_r = my_random_state.normalvariate(mu=0.0, sigma=noise_sigma)
         err_theta = my_random_state.random() * math.pi * 2
         err_x = err_r * math.cos(err_theta)
         err_y = err_r * math.sin(err_theta)
-        ret += ((i, x + err_x, y + err_y),)
-    return ret
+        ret.append((i, x + err_x, y + err_y))
+    return tuple(ret)
 
 
 class MalformedEstimate(Exception):
@@ -122,6 +216,51 @@ def validate_estimate(tpl):
         raise MalformedEstimate('Estimated location %s should be of the form (i, x, y), a triple with type (int, float, float) or equivalent numpy types.' % str(tpl))
 
 
+def estimate_array(estimated_locs):
+    """Convert estimates of meteorite locations to an (n, 3) float array.
+
+    Raises MalformedEstimate, like validate_estimate, if any estimate is
+    not an (i, x, y) triple.
+    """
+    try:
+        est = np.array(estimated_locs, dtype=float)
+    except (ValueError, TypeError):
+        est = None
+    if est is not None and est.size == 0:
+        return np.empty((0, 3))
+    if est is None or est.ndim != 2 or est.shape[1] != 3 or not np.isfinite(est[:, 0]).all():
+        est = np.array([validate_estimate(tpl) for tpl in estimated_locs], dtype=float)
+    return est
+
+
+def match_estimates(estimated_locs, actual, min_dist):
+    """Compare estimated meteorite locations to the actual ones.
+
+    actual is an (m, 3) array of (i, x, y) rows with unique ids.  Only the
+    first estimate for each id is used and estimates with id -1 are
+    ignored.  Returns the used estimates as an (n, 3) array, in the order
+    given, and a boolean array which is True where an estimate is within
+    min_dist of the actual location of its meteorite.
+    """
+    est = estimate_array(estimated_locs)
+    est_ids = est[:, 0].astype(np.int64)
+    _, first = np.unique(est_ids, return_index=True)
+    first.sort()
+    first = first[est_ids[first] != -1]
+    est, est_ids = est[first], est_ids[first]
+
+    is_match = np.zeros(len(est), dtype=bool)
+    if len(actual) and len(est):
+        actual_ids = actual[:, 0].astype(np.int64)
+        order = np.argsort(actual_ids)
+        pos = order[np.minimum(np.searchsorted(actual_ids, est_ids, sorter=order),
+                               len(order) - 1)]
+        found = actual_ids[pos] == est_ids
+        dist = np.hypot(est[:, 1] - actual[pos, 1], est[:, 2] - actual[pos, 2])
+        is_match = found & (dist < min_dist)
+    return est, is_match
+
+
 def run_estimation(field,
                    in_bounds,
                    noise_sigma,
@@ -131,13 +270,19 @@ def run_estimation(field,
                    max_angle_change,
                    nsteps,
                    seed,
-                   display=None):
+                   display=None,
+                   profiler=None):
     """Run the estimation procedure."""
     ret = (FAILURE_TOO_MANY_STEPS, nsteps)
     num_steps_gt_90pct = 0
 
     random_state = random.Random(seed)
 
+    if display is None:
+        display = NullRunnerDisplay()
+    if profiler is None:
+        profiler = NullStepProfiler()
+
     display.setup(field.x_bounds, field.y_bounds,
                   in_bounds,
                   margin=min_dist,
@@ -150,53 +295,35 @@ def run_estimation(field,
     for t in range(nsteps):
         display.begin_time_step(t)
 
-        meteorite_coordinates = field.meteorite_locations(t)
-
-        estimated_locs = turret.observe_and_estimate(
-                add_observation_noise(meteorite_coordinates, noise_sigma,
-                                      random_state))
-
-        actual = {}
-        matches = ()
-
-        for i, x, y in meteorite_coordinates:
-            if i == -1:
-                continue
-            display.meteorite_at_loc(i, x, y)
-            actual[i] = (x, y)
-
-        estimated_locs_seen = set()
+        meteorite_coordinates = profiler.call('meteorite_locations', t,
+                                              field.meteorite_locations, t)
 
-        for tpl in estimated_locs:
+        estimated_locs = profiler.call('observe_and_estimate', t,
+                                       turret.observe_and_estimate,
+                                       add_observation_noise(meteorite_coordinates,
+                                                             noise_sigma,
+                                                             random_state))
 
-            i, x, y = validate_estimate(tpl)
+        actual = np.array(meteorite_coordinates, dtype=float).reshape(-1, 3)
+        actual = actual[actual[:, 0] != -1]
 
-            if i in estimated_locs_seen:
-                continue
-            if i == -1:
-                continue
+        if display.draws_items:
+            for i, x, y in meteorite_coordinates:
+                if i == -1:
+                    continue
+                display.meteorite_at_loc(i, x, y)
 
-            estimated_locs_seen.add(i)
+        est, is_match = match_estimates(estimated_locs, actual, min_dist)
+        num_matches = np.count_nonzero(is_match)
 
-            if i in actual:
-                dist = l2((x, y), actual[i])
-                is_match = (dist < min_dist)
-                if is_match:
-                    matches += (i,)
-            else:
-                is_match = False
+        if display.draws_items:
+            for (i, x, y), match in zip(est.tolist(), is_match.tolist()):
+                display.meteorite_estimated_at_loc(int(i), x, y, match)
 
-            display.meteorite_estimated_at_loc(i, x, y, is_match)
-
-        # estimated = dict([(i, (x, y)) for i, x, y in estimated_locs])
-
-        # Calculate estimates for next time step.
-        # estimated_locs = turret.kf_estimate()
-
-        display.meteorite_estimates_compared(len(matches), len(actual))
+        display.meteorite_estimates_compared(num_matches, len(actual))
 
         # If this step's estimates were good enough, we're done.
-        if len(matches) > len(actual) * ESTIMATE_ACCURACY_THRESHOLD:
+        if num_matches > len(actual) * ESTIMATE_ACCURACY_THRESHOLD:
             num_steps_gt_90pct += 1
         else:
             num_steps_gt_90pct = 0
@@ -220,11 +347,22 @@ def run_defense(field,
                 max_angle_change,
                 nsteps,
                 seed,
-                display=None):
-    """Run defense procedure."""
+                display=None,
+                recorder=None,
+                profiler=None):
+    """Run defense procedure.
+
+    If a recorder (e.g. replay.ReplayRecorder) is given, the turret's
+    inputs and outputs at every timestep are passed to it.
+    """
     ret = (DEF_FAILURE, nsteps)
     random_state = random.Random(seed)
 
+    if display is None:
+        display = NullRunnerDisplay()
+    if profiler is None:
+        profiler = NullStepProfiler()
+
     display.setup(field.x_bounds, field.y_bounds,
                   in_bounds,
                   margin=min_dist,
@@ -242,25 +380,39 @@ def run_defense(field,
     laser_angle_rad = math.pi * 0.5
     laser_is_on = False
 
+    if recorder is not None:
+        recorder.begin_run(turret_pos={'x': turret.x_pos, 'y': turret.y_pos},
+                           initial_laser_state={'h': laser_angle_rad,
+                                                'hp': turret_init_health},
+                           max_angle_change=max_angle_change,
+                           min_dist=min_dist,
+                           noise_sigma=noise_sigma,
+                           nsteps=nsteps,
+                           seed=seed)
+
     for t in range(0, nsteps):
         display.begin_time_step(t)
 
         # Actual meteorite locations
-        meteorite_coordinates = field.meteorite_locations(t)
+        meteorite_coordinates = profiler.call('meteorite_locations', t,
+                                              field.meteorite_locations, t)
 
         if not meteorite_coordinates:
             break
 
         # Turret estimating meteorite locations from noisy observations
-        estimated_locs = turret.observe_and_estimate(
-                add_observation_noise(meteorite_coordinates, noise_sigma,
-                                      random_state))
+        observations = add_observation_noise(meteorite_coordinates, noise_sigma,
+                                             random_state)
+        estimated_locs = profiler.call('observe_and_estimate', t,
+                                       turret.observe_and_estimate, observations)
+        aim_angle_rad = laser_angle_rad
 
         # display the meteorites in the GUI
-        for i, x, y in meteorite_coordinates:
-            if i == -1:
-                continue
-            display.meteorite_at_loc(i, x, y)
+        if display.draws_items:
+            for i, x, y in meteorite_coordinates:
+                if i == -1:
+                    continue
+                display.meteorite_at_loc(i, x, y)
 
         # Display the turret and its health points
         display.turret_health(turret_health, turret_init_health)
@@ -269,8 +421,9 @@ def run_defense(field,
         if laser_is_on:
             display.laser_target_heading(laser_angle_rad, 2.0)
 
-        health_loss = field.laser_or_ground_hit(t, laser_angle_rad,
-                                                laser_is_on)
+        health_loss = profiler.call('laser_or_ground_hit', t,
+                                    field.laser_or_ground_hit, t,
+                                    laser_angle_rad, laser_is_on)
 
         # The turret does not lose any health points during the first
         # INIT_IMMUNITY_DTS timesteps of the simulation
@@ -284,10 +437,14 @@ def run_defense(field,
             display.laser_destruct()
             ret = (DEF_FAILURE, t)
             display.end_time_step(t)
+            if recorder is not None:
+                recorder.record_step(t, observations, estimated_locs,
+                                     aim_angle_rad, None, turret_health)
             break
         else:
             # Update laser_angle_rad for turret's aim in the current timestep
-            laser_action = turret.get_laser_action(laser_angle_rad)
+            laser_action = profiler.call('get_laser_action', t,
+                                         turret.get_laser_action, laser_angle_rad)
 
             if isinstance(laser_action, float) or isinstance(laser_action, int):
                 # if laser_action is a float or int, interpret it as the change
@@ -312,10 +469,17 @@ def run_defense(field,
 
             display.end_time_step(t)
 
+        if recorder is not None:
+            recorder.record_step(t, observations, estimated_locs,
+                                 aim_angle_rad, laser_action, turret_health)
+
     # we have reached the end of simulation time, so if the turret is not dead,
     # this case was a success
     if turret_health > 0:
         ret = (SUCCESS, t)
 
+    if recorder is not None:
+        recorder.end_run(*ret)
+
     display.teardown()
     return ret
@@ -16,8 +16,11 @@ from builtins import object
 import collections
 import io
 import multiprocessing as mproc
+import os
 import sys
+import time
 import traceback
+from multiprocessing.connection import wait
 
 import runner
 import text_display
@@ -34,6 +37,13 @@ except Exception as e:
 ESTIMATE_TIMEOUT = 10
 DEFENSE_TIMEOUT = 45
 
+# Grade cases concurrently on a pool of reusable worker processes.
+# Set to False to grade one case at a time.
+PARALLEL_GRADING = True
+# CPUs this process may run on (affinity and container limits), where known
+GRADING_PROCESSES = (len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity')
+                     else mproc.cpu_count())
+
 FAILURE_EXCEPTION = 'exception_raised'
 FAILURE_TIMEOUT = 'execution_time_exceeded'
 
@@ -65,6 +75,22 @@ def truncate_runlog(runlog, begin_lines=10, end_lines=10):
     else:
         return '\n'.join(lines[:begin_lines] + lines[-end_lines:])
 
+def run_case(method_name, case_num):
+    """Run one case and return its (retcode, t, runlog)."""
+    display = text_display.TextRunnerDisplay(fout=io.StringIO())
+    msg = ''
+
+    try:
+        kwargs = run_kwargs(case_params(case_num))
+        retcode, t = run_method(method_name)(display=display, **kwargs)
+    except Exception as e:
+        retcode = FAILURE_EXCEPTION
+        t = 1000
+        msg = traceback.format_exc()
+#        msg = str(e) + ': ' + str(e.message)
+
+    return retcode, t, display.fout.getvalue() + '\n' + msg
+
 class SingleCaseGrader(object):
 
     def __init__(self):
@@ -79,20 +105,7 @@ class SingleCaseGrader(object):
     def run(self, method_name, case_num):
 
         self._reset()
-
-        display = text_display.TextRunnerDisplay(fout=io.StringIO())
-        msg = ''
-
-        try:
-            kwargs = run_kwargs(case_params(case_num))
-            retcode, t = run_method(method_name)(display=display, **kwargs)
-        except Exception as e:
-            retcode = FAILURE_EXCEPTION
-            t = 1000
-            msg = traceback.format_exc()
-#            msg = str(e) + ': ' + str(e.message)
-
-        self.result_queue.put((retcode, t, display.fout.getvalue() + '\n' + msg))
+        self.result_queue.put(run_case(method_name, case_num))
 
 class MultiCaseGrader(object):
 
@@ -102,31 +115,39 @@ class MultiCaseGrader(object):
         self.fout = fout
         self.tasks = tuple(tasks)
 
+    def run_task(self, task):
+
+        scg = SingleCaseGrader()
+        test_process = mproc.Process(target=scg.run,
+                args=(task.method_name, task.case_num))
+        runlog = ''
+
+        try:
+            test_process.start()
+            test_process.join(task.timeout)
+        except Exception:
+            retcode = FAILURE_EXCEPTION
+
+        if test_process.is_alive():
+            test_process.terminate()
+            retcode = FAILURE_TIMEOUT
+        else:
+            if not scg.result_queue.empty():
+                retcode, t, runlog = scg.result_queue.get()
+            else:
+                retcode, t, runlog = 'EXITED', -1, 'program exited '
+
+        return retcode, runlog
+
+    def run_tasks(self):
+        return [self.run_task(task) for task in self.tasks]
+
     def run(self):
 
         score = 0
         max_score = 0
 
-        for task in self.tasks:
-            scg = SingleCaseGrader()
-            test_process = mproc.Process(target=scg.run,
-                    args=(task.method_name, task.case_num))
-            runlog = ''
-
-            try:
-                test_process.start()
-                test_process.join(task.timeout)
-            except Exception:
-                retcode = FAILURE_EXCEPTION
-
-            if test_process.is_alive():
-                test_process.terminate()
-                retcode = FAILURE_TIMEOUT
-            else:
-                if not scg.result_queue.empty():
-                    retcode, t, runlog = scg.result_queue.get()
-                else:
-                    retcode, t, runlog = 'EXITED', -1, 'program exited '
+        for task, (retcode, runlog) in zip(self.tasks, self.run_tasks()):
 
             case_score = task.weight if retcode == runner.SUCCESS else 0
 
@@ -146,6 +167,108 @@ class MultiCaseGrader(object):
         self.fout.write("score: %d\n" % percent)
 #        self.fout.write("overall score:  %d/%d\n" % (score, max_score))
 
+def pool_worker(task_queue, result_conn, worker_num):
+    """Run (task_num, task) items from task_queue until a None arrives.
+
+    Results go back through result_conn, a pipe only this worker writes to,
+    so terminating one worker mid-write cannot corrupt another's results.
+    """
+    while True:
+        item = task_queue.get()
+        if item is None:
+            break
+        task_num, task = item
+        result_conn.send((worker_num, task_num, run_case(task.method_name, task.case_num)))
+
+class PoolMultiCaseGrader(MultiCaseGrader):
+    """Grade all tasks concurrently on a pool of warm worker processes.
+
+    Each worker imports numpy and the turret once and then runs task after
+    task.  A worker whose task overruns its timeout is terminated and
+    replaced, so per-task timeouts are enforced as in MultiCaseGrader.
+    """
+
+    def __init__(self,
+                 fout,
+                 tasks=TASKS,
+                 processes=GRADING_PROCESSES):
+        super(PoolMultiCaseGrader, self).__init__(fout, tasks)
+        self.processes = max(1, min(processes, len(self.tasks)))
+
+    def _start_worker(self, worker_num):
+        task_queue = mproc.Queue()
+        result_conn, worker_conn = mproc.Pipe(duplex=False)
+        process = mproc.Process(target=pool_worker,
+                                args=(task_queue, worker_conn, worker_num))
+        process.daemon = True
+        process.start()
+        worker_conn.close()
+        return process, task_queue, result_conn
+
+    def _replace_worker(self, workers, worker_num):
+        process, task_queue, result_conn = workers[worker_num]
+        process.terminate()
+        result_conn.close()
+        workers[worker_num] = self._start_worker(worker_num)
+
+    def run_tasks(self):
+
+        workers = [self._start_worker(n) for n in range(self.processes)]
+        pending = collections.deque(enumerate(self.tasks))
+        running = {}  # worker_num -> (task_num, deadline)
+        results = {}
+
+        def dispatch(worker_num):
+            if pending:
+                task_num, task = pending.popleft()
+                workers[worker_num][1].put((task_num, task))
+                running[worker_num] = (task_num, time.time() + task.timeout)
+
+        for worker_num in range(self.processes):
+            dispatch(worker_num)
+
+        while running:
+            next_deadline = min(deadline for _, deadline in running.values())
+            ready = wait([workers[worker_num][2] for worker_num in running],
+                         timeout=max(0.01, min(1.0, next_deadline - time.time())))
+
+            for worker_num in list(running):
+                result_conn = workers[worker_num][2]
+                if result_conn not in ready:
+                    continue
+                try:
+                    result_worker, task_num, (retcode, t, runlog) = result_conn.recv()
+                except EOFError:
+                    continue  # the worker died; handled below
+                # Only accept the result of the task this worker is running now.
+                if (result_worker, task_num) != (worker_num, running[worker_num][0]):
+                    continue
+                results[task_num] = (retcode, runlog)
+                del running[worker_num]
+                dispatch(worker_num)
+
+            for worker_num, (task_num, deadline) in list(running.items()):
+                process = workers[worker_num][0]
+                if time.time() > deadline:
+                    results[task_num] = (FAILURE_TIMEOUT, '')
+                elif not process.is_alive():
+                    results[task_num] = ('EXITED', 'program exited ')
+                else:
+                    continue
+                self._replace_worker(workers, worker_num)
+                del running[worker_num]
+                dispatch(worker_num)
+
+        for process, task_queue, result_conn in workers:
+            task_queue.put(None)
+        for process, task_queue, result_conn in workers:
+            process.join(1)
+            if process.is_alive():
+                process.terminate()
+            result_conn.close()
+
+        return [results[task_num] for task_num in range(len(self.tasks))]
+
 if __name__ == '__main__':
     if studentExc:
         sys.stdout.write('error importing code:\n\n')
@@ -156,7 +279,10 @@ if __name__ == '__main__':
         student_id = turret.who_am_i()
         if student_id:
             try:
-                mcg = MultiCaseGrader(sys.stdout)
+                if PARALLEL_GRADING:
+                    mcg = PoolMultiCaseGrader(sys.stdout)
+                else:
+                    mcg = MultiCaseGrader(sys.stdout)
                 mcg.run()
             except Exception as e:
                 sys.stdout.write(e)
@@ -21,6 +21,7 @@ import sys
 # project files
 import meteorite
 import arena
+import case_store
 from turret import Turret
 import runner
 import cases
@@ -44,7 +45,7 @@ def display_for_name(dname):
     elif dname == 'text':
         return TextRunnerDisplay()
     else:
-        return runner.RunnerDisplay()
+        return None
 
 
 def case_params(case_num):
@@ -64,18 +65,24 @@ def run_method(method_name):
 
 def run_kwargs(params):
     """Set up kwargs for running main."""
-    meteorites = []
-    for themeteorite in params['meteorites']:
-        meteorites.append(meteorite.Meteorite(themeteorite))
-
     in_bounds = arena.Arena()
     turret = Turret(TURRET_INITIAL_POS, in_bounds.contains,
                     params['_args']['max_angle_change'],
                     params['initial_laser_state'])
 
-    ret = {'field': meteorite.MeteorShower(in_bounds, params['_args']['seed'],
-                                           P_HIT, meteorites, turret,
-                                           params['min_dist']),
+    if 'meteorite_columns' in params:
+        field = meteorite.MeteorShower.from_columns(in_bounds, params['_args']['seed'],
+                                                    P_HIT, params['meteorite_columns'],
+                                                    turret, params['min_dist'])
+    else:
+        meteorites = []
+        for themeteorite in params['meteorites']:
+            meteorites.append(meteorite.Meteorite(themeteorite))
+        field = meteorite.MeteorShower(in_bounds, params['_args']['seed'],
+                                       P_HIT, meteorites, turret,
+                                       params['min_dist'])
+
+    ret = {'field': field,
            'in_bounds': in_bounds,
            'noise_sigma': params['noise_sigma'],
            'min_dist': params['min_dist'],
@@ -88,27 +95,47 @@ def run_kwargs(params):
     return ret
 
 
-def main(method_name, case_id, display_name):
-    """Run the specified case using the specified method."""
+def load_params(case_id):
+    """Load the parameters of a case number, case file or columnar case directory."""
+    if case_store.is_case_dir(case_id):
+        return case_store.load_case(case_id)
+    try:
+        return cases.index[int(case_id)]
+    except Exception as e:
+        mdl_name = os.path.splitext(os.path.split(case_id)[1])[0]
+        mdl = importlib.import_module(mdl_name)
+        return mdl.params
+
+
+def main(method_name, case_id, display_name, profile=False, trace_file=None):
+    """Run the specified case using the specified method.
+
+    With profile set, print how long the turret and meteor shower took per
+    timestep; with trace_file set, also write their calls as a Chrome trace.
+    """
     try:
-        params = cases.index[int(case_id)]
+        params = load_params(case_id)
     except Exception as e:
-        try:
-            mdl_name = os.path.splitext(os.path.split(case_id)[1])[0]
-            mdl = importlib.import_module(mdl_name)
-            params = mdl.params
-        except Exception as e:
-            print(e)
-            return
+        print(e)
+        return
+
+    profiler = runner.StepProfiler() if profile or trace_file else None
 
     import timeit
     start = timeit.default_timer()
     retcode, t = run_method(method_name)(display=display_for_name(display_name),
+                                         profiler=profiler,
                                          **(run_kwargs(params)))
     stop = timeit.default_timer()
     print(f'Approximate run time: {stop - start} seconds')
     print((retcode, t))
 
+    if profiler is not None:
+        print(profiler.format_summary())
+    if trace_file:
+        profiler.write_trace(trace_file)
+        print(f'Wrote Chrome trace to {trace_file}')
+
 
 def parser():
     """Parse command-line arguments."""
@@ -125,6 +152,13 @@ def parser():
     prsr.add_argument('--display',
                       choices=('turtle', 'text', 'none'),
                       default='none')
+    prsr.add_argument('--profile',
+                      help="print time spent per timestep in the turret and meteor shower",
+                      action='store_true')
+    prsr.add_argument('--trace',
+                      help="write the profiled calls to this file as Chrome trace JSON",
+                      type=str,
+                      default=None)
     return prsr
 
 
@@ -140,4 +174,6 @@ if __name__ == '__main__':
         args.display = 'text'
     main(method_name=args.method,
          case_id=args.case,
-         display_name=args.display)
+         display_name=args.display,
+         profile=args.profile,
+         trace_file=args.trace)
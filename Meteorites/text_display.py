@@ -18,6 +18,8 @@ from runner import BaseRunnerDisplay
 
 class TextRunnerDisplay(BaseRunnerDisplay):
 
+    draws_items = False
+
     def __init__(self, fout=None):
         self.fout = fout
 
@@ -25,12 +25,561 @@ if OUTPUT_UNIQUE_FILE_ID:
     file_hash = hashlib.md5(pathlib.Path(__file__).read_bytes()).hexdigest()
     print(f'Unique file ID: {file_hash}')
 
+# Use the precomputed steady-state gain schedule instead of propagating a
+# covariance per meteorite.
+USE_GAIN_SCHEDULE = False
+
+# Track with an interacting multiple model (constant velocity + constant
+# acceleration) filter instead of the single constant-acceleration model.
+USE_IMM = False
+
+# Drop a meteorite's track after it has gone this many timesteps unobserved.
+TRACK_EVICTION_STEPS = 10
+
+# Only meteorites predicted to reach the ground within this many timesteps
+# are considered by the laser scheduler.
+PLAN_HORIZON_STEPS = 300
+
+# Tracks younger than this many updates have unreliable velocity and
+# acceleration estimates and are not scheduled.
+MIN_TRACK_AGE = 10
+
+# Threats with less slack than this are shot first, whatever the cost of
+# turning to them.
+URGENT_SLACK_STEPS = 20
+
+# Assumed laser hit distance when deciding whether the aim is close enough
+# to fire; the arena's true margin is not passed to the turret.
+LASER_HIT_MARGIN = 0.01
+
+# Associate observations with tracks by position instead of by meteorite id,
+# for sensors which cannot tell meteorites apart.
+ASSOCIATE_BY_POSITION = False
+
+# An observation further than this from a track's predicted position is
+# never associated with that track.
+ASSOCIATION_GATE = 0.05
+
+# When the ambiguous clusters of tracks and observations hold more members
+# than this in total, they are assigned by auction instead of one cubic
+# Hungarian solve per cluster.
+MAX_HUNGARIAN_NODES = 64
+
+
+class GainSchedule(object):
+    """Kalman gains K_k indexed by the number of updates a track has had.
+
+    Every track starts with P = I and shares F, H and R, and a track's
+    covariance only changes when it is observed, so its gain depends on
+    nothing but its age.  The schedule is computed once and extended on
+    demand when a track outlives it.
+    """
+
+    def __init__(self, F, H, R, P0, length=256):
+        """Precompute the first length gains starting from covariance P0."""
+        self.F = F
+        self.H = H
+        self.R = R
+        self.P = P0.copy()
+        self.K = np.zeros((0, P0.shape[0], H.shape[0]))
+        self._extend(length)
+
+    def _extend(self, length):
+        """Compute gains until the schedule holds length entries."""
+        I = np.identity(len(self.P))
+        K = list(self.K)
+        P = self.P
+        while len(K) < length:
+            S = np.matmul(self.H, np.matmul(P, self.H.T)) + self.R
+            Kk = np.matmul(P, np.matmul(self.H.T, np.linalg.inv(S)))
+            P = np.matmul(self.F, np.matmul(np.matmul(I - np.matmul(Kk, self.H), P), self.F.T))
+            K.append(Kk)
+        self.K = np.array(K)
+        self.P = P
+
+    def gains(self, ages):
+        """Return the (n,6,2) gains for tracks of the given ages."""
+        if len(ages) and ages.max() >= len(self.K):
+            self._extend(2 * (ages.max() + 1))
+        return self.K[ages]
+
+
+class BatchKalmanFilter(object):
+    """Constant-acceleration Kalman filter for many meteorites at once.
+
+    States are stored as an (N,6) array [x, y, dx, dy, dxx, dyy] and
+    covariances as an (N,6,6) array.  rows maps a meteorite id to its row
+    and age counts the updates each track has had.  With a gain schedule
+    the covariances are not propagated at all.
+
+    Tracks not observed for max_missed steps are evicted by end_step and
+    their rows are reused, so memory is bounded by the peak number of
+    meteorites tracked at once rather than the number ever seen.
+    """
+
+    ARRAYS = ('x', 'P', 'ids', 'age', 'last_seen', 'active')
+
+    def __init__(self, F, H, R, capacity=64, gain_schedule=False,
+                 max_missed=TRACK_EVICTION_STEPS):
+        """Initialize an empty filter with room for capacity tracks."""
+        self.F = F
+        self.H = H
+        self.R = R
+        self.x = np.zeros((capacity, 6))
+        self.P = np.zeros((capacity, 6, 6))
+        self.ids = np.zeros(capacity, dtype=np.int64)
+        self.age = np.zeros(capacity, dtype=np.int64)
+        self.last_seen = np.zeros(capacity, dtype=np.int64)
+        self.active = np.zeros(capacity, dtype=bool)
+        self.rows = {}
+        self.schedule = GainSchedule(F, H, R, np.identity(6)) if gain_schedule else None
+
+        self.max_missed = max_missed
+        self.t = 0
+        self.size = 0
+        self.free = []
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _grow(self, size):
+        """Double the array capacity until size tracks fit."""
+        capacity = len(self.x)
+        while capacity < size:
+            capacity *= 2
+        if capacity == len(self.x):
+            return
+        for name in self.ARRAYS:
+            arr = getattr(self, name)
+            extra = np.zeros((capacity - len(arr),) + arr.shape[1:], dtype=arr.dtype)
+            setattr(self, name, np.concatenate((arr, extra)))
+
+    def _allocate(self):
+        """Return a free row, reusing evicted rows first."""
+        if self.free:
+            return self.free.pop()
+        self.size += 1
+        return self.size - 1
+
+    def lookup(self, ids, zs):
+        """Return the rows of ids, creating tracks at zs for unseen ids."""
+        rows = np.empty(len(ids), dtype=np.int64)
+        new = []
+        for k, i in enumerate(ids):
+            row = self.rows.get(i)
+            if row is None:
+                row = self._allocate()
+                self.rows[i] = row
+                new.append(k)
+            rows[k] = row
+
+        if new:
+            new = np.array(new)
+            self._grow(self.size)
+            created = rows[new]
+            self.ids[created] = np.asarray(ids)[new]
+            self.x[created] = 0.
+            self.x[created, :2] = zs[new]
+            self.P[created] = np.identity(6)
+            self.age[created] = 0
+            self.active[created] = True
+        return rows
+
+    def update(self, rows, zs):
+        """Observe zs for the given rows, then predict them one step ahead."""
+        x = self.x[rows]
+        ages = self.age[rows]
+        self.age[rows] = ages + 1
+        self.last_seen[rows] = self.t
+
+        if self.schedule is not None:
+            K = self.schedule.gains(ages)
+            x = x + np.einsum('nij,nj->ni', K, zs - x[:, :2])
+            x = np.matmul(x, self.F.T)
+            self.x[rows] = x
+            return x
+
+        P = self.P[rows]
+
+    #   Observe.  H picks the position, so H P = P[:, :2, :] and H P H^T = P[:, :2, :2]
+        y = zs - x[:, :2]
+        S = P[:, :2, :2] + self.R
+        K = np.matmul(P[:, :, :2], np.linalg.inv(S))
+        x = x + np.einsum('nij,nj->ni', K, y)
+        P = P - np.matmul(K, P[:, :2, :])
+
+    #   Predict
+        x = np.matmul(x, self.F.T)
+        P = np.matmul(self.F, np.matmul(P, self.F.T))
+
+        self.x[rows] = x
+        self.P[rows] = P
+        return x
+
+    def predict(self, rows):
+        """Predict the given rows one step further ahead."""
+        self.x[rows] = np.matmul(self.x[rows], self.F.T)
+        self.P[rows] = np.matmul(self.F, np.matmul(self.P[rows], self.F.T))
+
+    def coast(self, rows):
+        """Predict rows which were missed on earlier steps up to the current step."""
+        missed = self.t - 1 - self.last_seen[rows]
+        missed[self.age[rows] == 0] = 0
+        for k in range(1, int(missed.max(initial=0)) + 1):
+            self.predict(rows[missed >= k])
+
+    def predicted_positions(self, rows):
+        """Return the positions of rows predicted for the current step."""
+        k = np.maximum(self.t - 1 - self.last_seen[rows], 0)[:, None]
+        x = self.x[rows]
+        return x[:, :2] + k * x[:, 2:4] + 0.5 * k * k * x[:, 4:6]
+
+    def end_step(self):
+        """Advance the filter clock and evict tracks missed for max_missed steps."""
+        self.t += 1
+        stale = np.flatnonzero(self.active[:self.size] &
+                               (self.t - self.last_seen[:self.size] > self.max_missed))
+        for row in stale:
+            del self.rows[int(self.ids[row])]
+        self.active[stale] = False
+        self.free.extend(stale.tolist())
+        self.evicted += len(stale)
+
+    def stats(self):
+        """Return track counts and the memory held by the track arrays."""
+        return {'tracks': len(self.rows),
+                'free_rows': len(self.free),
+                'capacity': len(self.x),
+                'evicted': self.evicted,
+                'bytes': sum(getattr(self, name).nbytes for name in self.ARRAYS)}
+
+
+class BatchIMMFilter(BatchKalmanFilter):
+    """Interacting multiple model filter over constant-velocity and
+    constant-acceleration models, batched over all tracks.
+
+    Each track keeps a state and covariance per model (xm, Pm) and the
+    predicted model probabilities mu.  Every update runs the models' Kalman
+    updates side by side, reweights the models by their measurement
+    likelihoods, mixes them through the transition matrix PI and predicts
+    each one step ahead.  x and P hold the combined prediction, so the
+    filter is a drop-in replacement for BatchKalmanFilter.
+    """
+
+    ARRAYS = BatchKalmanFilter.ARRAYS + ('xm', 'Pm', 'mu')
+
+    # probability of staying in / switching between the CV and CA models.
+    # CV lets young tracks settle quickly; CA is nearly absorbing since the
+    # meteorites really do accelerate.
+    PI = np.array([[0.90, 0.10],
+                   [0.01, 0.99]])
+
+    def __init__(self, F, H, R, capacity=64, max_missed=TRACK_EVICTION_STEPS,
+                 q_cv=1e-6, q_ca=0.):
+        """Initialize an empty IMM filter; F is the constant-acceleration model."""
+        super(BatchIMMFilter, self).__init__(F, H, R, capacity,
+                                             max_missed=max_missed)
+        F_cv = F.copy()
+        F_cv[:, 4:] = 0.
+        F_cv[4:, :] = 0.
+        self.Fm = np.stack((F_cv, F))
+
+        Q_cv = np.zeros((6, 6))
+        Q_cv[2, 2] = Q_cv[3, 3] = q_cv
+        Q_ca = np.zeros((6, 6))
+        Q_ca[4, 4] = Q_ca[5, 5] = q_ca
+        self.Qm = np.stack((Q_cv, Q_ca))
+
+        self.xm = np.zeros((capacity, 2, 6))
+        self.Pm = np.zeros((capacity, 2, 6, 6))
+        self.mu = np.zeros((capacity, 2))
+
+    def lookup(self, ids, zs):
+        """Return the rows of ids, creating tracks at zs for unseen ids."""
+        rows = super(BatchIMMFilter, self).lookup(ids, zs)
+        created = rows[self.age[rows] == 0]
+        self.xm[created] = self.x[created][:, None, :]
+        self.Pm[created] = np.identity(6)
+        self.mu[created] = 0.5
+        return rows
+
+    def predict(self, rows):
+        """Predict the given rows one step further ahead with each model."""
+        xm = np.einsum('mab,nmb->nma', self.Fm, self.xm[rows])
+        Pm = np.matmul(self.Fm, np.matmul(self.Pm[rows], np.swapaxes(self.Fm, 1, 2))) + self.Qm
+        mu = self.mu[rows]
+        x = np.einsum('nm,nma->na', mu, xm)
+        dx = xm - x[:, None, :]
+        self.xm[rows] = xm
+        self.Pm[rows] = Pm
+        self.x[rows] = x
+        self.P[rows] = np.einsum('nm,nmab->nab', mu, Pm + dx[..., :, None] * dx[..., None, :])
+
+    def update(self, rows, zs):
+        """Observe zs for the given rows, then predict them one step ahead."""
+        xm = self.xm[rows]
+        Pm = self.Pm[rows]
+        mu = self.mu[rows]
+        self.age[rows] += 1
+        self.last_seen[rows] = self.t
+
+    #   Per-model observe
+        y = zs[:, None, :] - xm[:, :, :2]
+        S = Pm[:, :, :2, :2] + self.R
+        S_inv = np.linalg.inv(S)
+        K = np.matmul(Pm[:, :, :, :2], S_inv)
+        xm = xm + np.einsum('nmij,nmj->nmi', K, y)
+        Pm = Pm - np.matmul(K, Pm[:, :, :2, :])
+
+    #   Model probabilities from the measurement likelihoods
+        mahalanobis = np.einsum('nmi,nmij,nmj->nm', y, S_inv, y)
+        likelihood = np.exp(-0.5 * mahalanobis) / (2. * pi * np.sqrt(np.linalg.det(S)))
+        mu = mu * likelihood + 1e-300
+        mu = mu / mu.sum(axis=1, keepdims=True)
+
+    #   Mix the models through the transition matrix
+        mu_pred = np.matmul(mu, self.PI)
+        w = self.PI[None, :, :] * mu[:, :, None] / mu_pred[:, None, :]
+        x0 = np.einsum('nij,nia->nja', w, xm)
+        dx = xm[:, :, None, :] - x0[:, None, :, :]
+        P0 = np.einsum('nij,nijab->njab', w,
+                       Pm[:, :, None] + dx[..., :, None] * dx[..., None, :])
+
+    #   Per-model predict, then combine
+        xm = np.einsum('mab,nmb->nma', self.Fm, x0)
+        Pm = np.matmul(self.Fm, np.matmul(P0, np.swapaxes(self.Fm, 1, 2))) + self.Qm
+        x = np.einsum('nm,nma->na', mu_pred, xm)
+        dx = xm - x[:, None, :]
+        P = np.einsum('nm,nmab->nab', mu_pred, Pm + dx[..., :, None] * dx[..., None, :])
+
+        self.xm[rows] = xm
+        self.Pm[rows] = Pm
+        self.mu[rows] = mu_pred
+        self.x[rows] = x
+        self.P[rows] = P
+        return x
+
+
+def crossing_steps(y, dy, dyy, level):
+    """Return the first step k > 0 at which y + k dy + k^2 dyy / 2 drops below level.
+
+    Meteorites that never cross within PLAN_HORIZON_STEPS get inf.
+    """
+    a = 0.5 * dyy
+    c = y - level
+    with np.errstate(divide='ignore', invalid='ignore'):
+        disc = np.sqrt(dy * dy - 4. * a * c)
+        roots = np.stack(((-dy - disc) / (2. * a), (-dy + disc) / (2. * a)))
+        linear = np.where(dy < 0, -c / dy, np.inf)
+    roots = np.where(np.abs(a) < 1e-12, linear, roots)
+    roots = np.where((roots > 0) & np.isfinite(roots), roots, np.inf).min(axis=0)
+    roots[c <= 0] = 0.
+    roots[roots > PLAN_HORIZON_STEPS] = np.inf
+    return roots
+
+
+def gate_pairs(tracks, zs, gate):
+    """Return the (track, observation) index pairs closer than gate, and
+    their squared distances.
+
+    Observations are hashed into a grid of gate-sized cells, so only the
+    observations in the 3x3 cells around each track are compared with it.
+    """
+    cells = np.floor(zs / gate).astype(np.int64)
+    keys = cells[:, 0] * 1000003 + cells[:, 1]
+    order = np.argsort(keys)
+    sorted_keys = keys[order]
+
+    track_cells = np.floor(tracks / gate).astype(np.int64)
+    offsets = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+    near = track_cells[:, None, :] + offsets[None, :, :]
+    near_keys = (near[..., 0] * 1000003 + near[..., 1]).ravel()
+
+    lo = np.searchsorted(sorted_keys, near_keys, side='left')
+    hi = np.searchsorted(sorted_keys, near_keys, side='right')
+    counts = hi - lo
+    starts = np.repeat(lo - np.cumsum(counts) + counts, counts)
+    track_idx = np.repeat(np.arange(len(near_keys)) // len(offsets), counts)
+    obs_idx = order[np.arange(counts.sum()) + starts]
+
+    d2 = ((tracks[track_idx] - zs[obs_idx]) ** 2).sum(axis=1)
+    inside = d2 < gate * gate
+    return track_idx[inside], obs_idx[inside], d2[inside]
+
+
+def connected_components(n, u, v):
+    """Label the connected components of the graph on n nodes with edges (u, v)."""
+    labels = np.arange(n)
+    while True:
+        lowest = np.minimum(labels[u], labels[v])
+        new = labels.copy()
+        np.minimum.at(new, u, lowest)
+        np.minimum.at(new, v, lowest)
+        new = new[new]
+        if np.array_equal(new, labels):
+            return labels
+        labels = new
+
+
+def hungarian(cost):
+    """Return the rows and columns of a minimum cost assignment.
+
+    Every row of cost is assigned if it has no more rows than columns, and
+    every column otherwise (shortest augmenting paths with potentials).
+    """
+    if cost.shape[0] > cost.shape[1]:
+        cols, rows = hungarian(cost.T)
+        order = np.argsort(rows)
+        return rows[order], cols[order]
+
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=np.int64)
+    way = np.zeros(m + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while p[j0] != 0:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            better = free[1:] & (reduced < minv[1:])
+            minv[1:][better] = reduced[better]
+            way[1:][better] = j0
+            candidates = np.where(free[1:], minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[free] -= delta
+            j0 = j1
+        while j0 != 0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+
+    cols = np.flatnonzero(p[1:])
+    return p[1:][cols] - 1, cols
+
+
+def auction(n_bidders, n_objects, bidders, objects, benefit, eps):
+    """Assign bidders to objects along the given edges by a sparse auction.
+
+    Every bidder may also stay unassigned at zero benefit.  All unassigned
+    bidders bid at once each round, so the work per round is a few array
+    operations over the edges.  The total benefit is within eps per bidder
+    of the best possible.  Returns the assigned bidder and object indices.
+    """
+    order = np.lexsort((objects, bidders))
+    bidders, objects, benefit = bidders[order], objects[order], benefit[order]
+    price = np.zeros(n_objects)
+    owner = np.full(n_objects, -1)
+    assigned = np.full(n_bidders, -1)
+    waiting = np.zeros(n_bidders, dtype=bool)
+    waiting[bidders] = True
+
+    while waiting.any():
+        e = np.flatnonzero(waiting[bidders])
+        value = benefit[e] - price[objects[e]]
+        e_order = np.lexsort((-value, bidders[e]))
+        e, value = e[e_order], value[e_order]
+        b = bidders[e]
+        first = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+        last = np.r_[first[1:], len(e)]
+        best = value[first]
+        second = np.where(last - first > 1, value[np.minimum(first + 1, len(e) - 1)], 0.)
+        second = np.maximum(second, 0.)
+
+    #   Staying unassigned is best for good once the best value drops to zero
+        bidding = best > 0
+        waiting[b[first[~bidding]]] = False
+        first = first[bidding]
+        if not len(first):
+            continue
+        bid_bidders = b[first]
+        bid_objects = objects[e[first]]
+        bids = price[bid_objects] + best[bidding] - second[bidding] + eps
+
+    #   Each object goes to its highest bidder
+        won = np.lexsort((-bids, bid_objects))
+        won = won[np.r_[True, bid_objects[won][1:] != bid_objects[won][:-1]]]
+        won_objects = bid_objects[won]
+        outbid = owner[won_objects]
+        outbid = outbid[outbid >= 0]
+        assigned[outbid] = -1
+        waiting[outbid] = True
+        owner[won_objects] = bid_bidders[won]
+        price[won_objects] = bids[won]
+        assigned[bid_bidders[won]] = won_objects
+        waiting[bid_bidders[won]] = False
+
+    matched = np.flatnonzero(assigned >= 0)
+    return matched, assigned[matched]
+
+
+def associate(tracks, zs, gate):
+    """Assign observations zs to predicted track positions.
+
+    Returns the matched track and observation indices, minimizing the total
+    squared distance of the matched pairs plus gate**2 for each unmatched
+    observation; pairs further apart than gate are never matched.  Tracks
+    and observations are split into clusters connected by gated pairs.
+    Unambiguous pairs are matched directly and the other clusters by the
+    Hungarian method, or by an auction when there are many of them.
+    """
+    t_idx, o_idx, d2 = gate_pairs(tracks, zs, gate)
+    if not len(t_idx):
+        return t_idx, o_idx
+
+    n_tracks = len(tracks)
+    labels = connected_components(n_tracks + len(zs), t_idx, o_idx + n_tracks)
+    edge_labels = labels[t_idx]
+    nodes_per_cluster = np.bincount(labels, minlength=len(labels))
+    edges_per_cluster = np.bincount(edge_labels, minlength=len(labels))
+
+    single = edges_per_cluster[edge_labels] == 1
+    matched_t = [t_idx[single]]
+    matched_o = [o_idx[single]]
+
+    shared = np.flatnonzero(~single)
+    clusters = np.unique(edge_labels[shared])
+    if nodes_per_cluster[clusters].sum() > MAX_HUNGARIAN_NODES:
+        o, t = auction(len(zs), n_tracks, o_idx[shared], t_idx[shared],
+                       gate * gate - d2[shared], 1e-3 * gate * gate)
+        matched_t.append(t)
+        matched_o.append(o)
+        shared = shared[:0]
+
+    shared = shared[np.argsort(edge_labels[shared], kind='stable')]
+    bounds = np.flatnonzero(np.diff(edge_labels[shared])) + 1
+    for edges in np.split(shared, bounds) if len(shared) else ():
+        cluster_t, t_local = np.unique(t_idx[edges], return_inverse=True)
+        cluster_o, o_local = np.unique(o_idx[edges], return_inverse=True)
+        cost = np.full((len(cluster_t), len(cluster_o)), gate * gate)
+        cost[t_local, o_local] = d2[edges]
+        gated = np.zeros(cost.shape, dtype=bool)
+        gated[t_local, o_local] = True
+        rows, cols = hungarian(cost)
+        keep = gated[rows, cols]
+        matched_t.append(cluster_t[rows[keep]])
+        matched_o.append(cluster_o[cols[keep]])
+
+    return np.concatenate(matched_t), np.concatenate(matched_o)
+
 
 class Turret(object):
     """The laser used to defend against invading Meteorites."""
 
     def __init__(self, init_pos, arena_contains_fcn, max_angle_change,
-                 initial_state):
+                 initial_state, gain_schedule=USE_GAIN_SCHEDULE,
+                 max_missed_steps=TRACK_EVICTION_STEPS, imm=USE_IMM,
+                 associate_by_position=ASSOCIATE_BY_POSITION,
+                 gate=ASSOCIATION_GATE):
         """Initialize the Turret."""
         self.x_pos = init_pos['x']
         self.y_pos = init_pos['y']
@@ -68,10 +617,26 @@ class Turret(object):
         Q = Q * 0.1
         self.Q = Q
 
-    #   Initialize self.Data
-        self.Data = [[], [], []]
+    #   One filter holds the states of all meteorites
+        if imm:
+            self.kf = BatchIMMFilter(self.F, self.H, self.R,
+                                     max_missed=max_missed_steps)
+        else:
+            self.kf = BatchKalmanFilter(self.F, self.H, self.R,
+                                        gain_schedule=gain_schedule,
+                                        max_missed=max_missed_steps)
+        self.locations = np.empty((0, 3))
 
-        self.val = 'turn'
+    #   Tracks are made up from positions alone when associating by position
+        self.associate_by_position = associate_by_position
+        self.gate = gate
+        self.next_track_id = 1
+
+    #   Predicted states and ground crossing steps of threatening meteorites
+        self.threats = np.empty((0, 6))
+        self.threat_ids = np.empty(0)
+        self.deadlines = np.empty(0)
+        self.target_id = None
 
 
     def observe_and_estimate(self, meteorite_locations):
@@ -89,58 +654,70 @@ class Turret(object):
         In this function, return the estimated meteorite locations as a tuple
         of (i, x, y) tuples, where i is a meteorite's ID, x is its
         x-coordinate, and y is its y-coordinate.
+
+        With associate_by_position the IDs are not used to find a meteorite's
+        track; observations may then also be plain (x, y) pairs.  The returned
+        i is the observation's own ID when it has one, and the ID of the track
+        it was assigned to for (x, y) pairs.
+
+        Observations with ID -1 (destroyed meteorites) are dropped before
+        tracking, so they are neither estimated nor targeted.
         """
-        # TODO: Update the Turret's estimate of where the meteorites are
-        # located at the current timestep and return the updated estimates
-
-
-        # State uncertainty model P
-
-        ret = []
-        for id,xi,yi in meteorite_locations:
-            try:
-                Pindex = self.Data[0].index(id)
-            except ValueError:
-                self.Data[0].append(id)
-                Pindex = self.Data[0].index(id)
-            #   Data[1] is P
-                P = np.identity(6)
-                self.Data[1].append(P)
-            #   Data[2] is x
-            #   x(bat) = [x,y,dx,dy,dxx,dyy]
-                x = np.zeros((6,1))
-                x[0][0] = xi
-                x[1][0] = yi
-                self.Data[2].append(x)
-            else:
-                P = self.Data[1][Pindex]
-                x = self.Data[2][Pindex]
+        obs = np.array(meteorite_locations, dtype=float)
+        if obs.ndim == 2 and obs.shape[1] == 3:
+            obs = obs[obs[:, 0] != -1]
+
+        if not len(obs):
+            self.kf.end_step()
+            self.locations = np.empty((0, 3))
+            self.threats = np.empty((0, 6))
+            self.threat_ids = np.empty(0)
+            self.deadlines = np.empty(0)
+            return ()
+
+        if self.associate_by_position:
+            zs = obs[:, -2:]
+            rows = self._associate(zs)
+            ids = self.kf.ids[rows] if obs.shape[1] == 2 else obs[:, 0].astype(np.int64)
+            ids = ids.tolist()
+        else:
+            ids = obs[:, 0].astype(np.int64).tolist()
+            zs = obs[:, 1:]
+            rows = self.kf.lookup(ids, zs)
+
+        x = self.kf.update(rows, zs)
+        self.kf.end_step()
 
-            Z = np.zeros((2,1))
-            Z[0][0] = xi
-            Z[1][0] = yi
+    #   To be used for defense
+        self.locations = np.column_stack((ids, x[:, 0], x[:, 1]))
+        self._cache_threats(np.array(ids, dtype=np.int64), x, self.kf.age[rows])
 
-        #   Observe
-            y = Z - np.matmul(self.H,x)
-            S = np.matmul(self.H, np.matmul(P, self.H.transpose())) + self.R
-            K = np.matmul(P, np.matmul(self.H.transpose(), np.linalg.inv(S)))
-            x = x + np.matmul(K, y)
-            P = np.matmul((self.I - np.matmul(K, self.H)), P)
+        return tuple(zip(ids, x[:, 0].tolist(), x[:, 1].tolist()))
 
-        #   Predict
-            x = np.matmul(self.F, x)
-            P = np.matmul(self.F, np.matmul(P, self.F.transpose())) #+ self.Q
+    def _associate(self, zs):
+        """Return the track rows for anonymous observations zs.
 
-            self.Data[1][Pindex] = P
-            self.Data[2][Pindex] = x
+        Observations are matched to the tracks' predicted positions within
+        the gate; the rest start new tracks.
+        """
+        tracks = np.flatnonzero(self.kf.active[:self.kf.size])
+        matched_t, matched_o = associate(self.kf.predicted_positions(tracks), zs, self.gate)
 
-        #   To be used for defense
+        rows = np.empty(len(zs), dtype=np.int64)
+        rows[matched_o] = tracks[matched_t]
+        self.kf.coast(rows[matched_o])
 
-            ret.append((id,x[0][0],x[1][0]))
+        new = np.ones(len(zs), dtype=bool)
+        new[matched_o] = False
+        new = np.flatnonzero(new)
+        new_ids = list(range(self.next_track_id, self.next_track_id + len(new)))
+        self.next_track_id += len(new)
+        rows[new] = self.kf.lookup(new_ids, zs[new])
+        return rows
 
-        self.locations = np.array(ret)
-        ret = tuple(ret)
-        return ret
+    def track_stats(self):
+        """Return the track count and memory statistics of the filter."""
+        return self.kf.stats()
 
     def get_laser_action(self, current_aim_rad):
         """Return the laser's action; it can change its aim angle or fire.
@@ -163,36 +740,99 @@ class Turret(object):
         Returns: Float (desired change in laser aim angle, in radians), OR
         String 'fire' to fire the laser
         """
-        # TODO: Update the change in the laser aim angle, in radians, based
-        # on where the meteorites are currently, OR return 'fire' to fire the
-        # laser at a meteorite
-
-        if (self.val == 'turn'):
-            self.locations = self.locations[self.locations[:,0]>0]
-            x = self.locations[:,1]
-            y = self.locations[:,2]
-            if (len(y)<1):
-                return 'fire'
-            Pindex = np.argmin(y)
-            metnum = self.locations[:,0][Pindex]
-            xi = x[Pindex]
-            yi = y[Pindex]
-            dx = xi
-            dy = yi + 1.
-            final = atan2(dy, dx)
-            final = max(final,0.001)
-            final = min(final,pi - 0.001)
-            decision = final - current_aim_rad
-            if (decision > self.max_angle_change):
-                decision = self.max_angle_change - 0.0001
-            elif (decision < -self.max_angle_change):
-                decision = -self.max_angle_change + 0.0001
-            self.val = 'fire'
-        else:
-            decision = 'fire'
-            self.val = 'turn'
+        if not len(self.threats):
+            return 'fire'
+
+        target, turns, aim = self.plan_intercept(current_aim_rad)
+        if target is None or turns == 0:
+            return 'fire'
+
+        decision = aim - current_aim_rad
+        return float(np.clip(decision, -self.max_angle_change, self.max_angle_change))
+
+    def _cache_threats(self, ids, x, ages):
+        """Keep the predicted states of meteorites that will hit the ground.
 
-        return decision  # or 'fire'
+        x holds the filter states predicted for the step the next laser action
+        applies to.  Crossing steps are computed once here so that planning in
+        get_laser_action only deals with meteorites that matter.
+        """
+        deadlines = crossing_steps(x[:, 1], x[:, 3], x[:, 5], self.y_pos)
+        threat = (ids > 0) & (ages >= MIN_TRACK_AGE) & np.isfinite(deadlines)
+
+    #   Meteorites landing outside the arena do not cost health
+        rows = np.flatnonzero(threat)
+        t = deadlines[rows]
+        x_land = x[rows, 0] + t * x[rows, 2] + 0.5 * t * t * x[rows, 4]
+        for k, xl in zip(rows.tolist(), x_land.tolist()):
+            if not self.arena_contains_fcn((xl, self.y_pos)):
+                threat[k] = False
+
+        self.threats = x[threat]
+        self.threat_ids = ids[threat]
+        self.deadlines = deadlines[threat]
+
+    def aim_angles(self, states, k):
+        """Return the aim angle and range to states predicted k steps ahead."""
+        dx = states[:, 0] + k * states[:, 2] + 0.5 * k * k * states[:, 4] - self.x_pos
+        dy = states[:, 1] + k * states[:, 3] + 0.5 * k * k * states[:, 5] - self.y_pos
+        return np.arctan2(dy, dx), np.hypot(dx, dy)
+
+    def plan_intercept(self, current_aim_rad):
+        """Pick the next meteorite to shoot and how to get the laser onto it.
+
+        For every threat, the number of turns needed before the laser can fire
+        at its predicted position is found from max_angle_change; threats that
+        would reach the ground first are infeasible.  If any feasible threat
+        has less than URGENT_SLACK_STEPS of slack (deadline minus turns), the
+        one with the least slack is chosen.  Otherwise the aim that lines up
+        the most threats per step spent turning and firing is chosen.  The
+        chosen target is kept while the laser turns toward it unless another
+        threat becomes urgent.
+
+        Returns (index into self.threats, turns, aim angle at fire time), or
+        (None, None, None) if no threat can be intercepted.
+        """
+        states = self.threats
+        angle, dist = self.aim_angles(states, 0)
+        tolerance = np.arcsin(np.minimum(1., LASER_HIT_MARGIN / np.maximum(dist, LASER_HIT_MARGIN)))
+
+    #   Turns needed, refined once with the angle at the predicted fire step
+        turns = np.zeros(len(states))
+        for _ in range(2):
+            angle, dist = self.aim_angles(states, turns)
+            angle = np.clip(angle, 0., pi)
+            offset = np.abs(angle - current_aim_rad)
+            turns = np.where(offset <= tolerance, 0., np.ceil(offset / self.max_angle_change))
+
+        feasible = np.flatnonzero(turns < self.deadlines)
+        if not len(feasible):
+            self.target_id = None
+            return None, None, None
+
+    #   Something is lined up already: fire at it
+        ready = feasible[turns[feasible] == 0]
+        if len(ready):
+            best = ready[np.argmin(self.deadlines[ready])]
+            return best, 0, angle[best]
+
+        slack = self.deadlines[feasible] - turns[feasible]
+        urgent = feasible[slack < URGENT_SLACK_STEPS]
+        if len(urgent):
+            best = urgent[np.argmin(self.deadlines[urgent] - turns[urgent])]
+        else:
+            current = feasible[self.threat_ids[feasible] == self.target_id]
+            if len(current):
+                best = current[0]
+            else:
+            #   Threats within each aim's hit tolerance, counted on sorted angles
+                sorted_angles = np.sort(angle[feasible])
+                aligned = (np.searchsorted(sorted_angles, angle[feasible] + tolerance[feasible]) -
+                           np.searchsorted(sorted_angles, angle[feasible] - tolerance[feasible]))
+                best = feasible[np.lexsort((slack, -aligned / (turns[feasible] + 1.)))[0]]
+
+        self.target_id = self.threat_ids[best]
+        return best, int(turns[best]), angle[best]
 
 
 def who_am_i():